@@ -0,0 +1,203 @@
+#===bulk offline processing of menu images -> streaming JSONL results, resumable after a crash
+# python -m batch_process test_data/ --output results/menus.jsonl
+# python -m batch_process manifest.jsonl --output results/menus.jsonl --concurrency 16
+# manifest lines: {"id": "restaurant-42-page-1", "path": "menus/42/1.jpg"}   (id optional, relative paths resolve against the manifest)
+# rerunning with the same --output skips every image already written there
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+from utils.helper_functions import process_image_async, merge_dish_lists
+from mcp_modules.classify_veg_dishes import classify_dish_batch_async, collect_veg_dishes
+from utils.load_config import load_config
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+#====================================
+#--load config from config.yaml file
+config = load_config()
+#====================================
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif", ".tif", ".tiff")
+
+
+def list_images(source: str) -> List[Dict[str, str]]:
+    """
+    Images to process as [{"id", "path"}] from a directory (recursive) or a JSONL manifest.
+    """
+    if os.path.isdir(source):
+        items = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    items.append({"id": os.path.relpath(path, source), "path": path})
+        return sorted(items, key=lambda item: item["id"])
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    items = []
+    with open(source) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            path = entry["path"] if os.path.isabs(entry["path"]) else os.path.join(base_dir, entry["path"])
+            items.append({"id": str(entry.get("id", entry["path"])), "path": path})
+    return items
+
+
+def load_checkpoint(output_path: str) -> set:
+    """
+    Ids whose latest record in the output file succeeded. Failed images are processed again
+    (the retry's record is appended and supersedes the failed one); a line cut off by a crash
+    is dropped from the file so the image is processed again.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    latest_status = {}
+    valid_bytes = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                latest_status[record["id"]] = record.get("status", "ok")
+            except (ValueError, KeyError):
+                break
+            valid_bytes += len(line)
+    if valid_bytes < os.path.getsize(output_path):
+        logger.warning(f"dropping incomplete trailing record from {output_path}")
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return {item_id for item_id, status in latest_status.items() if status == "ok"}
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def extract_item(item: Dict[str, str], semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+    async with semaphore:
+        try:
+            contents = await asyncio.to_thread(read_file, item["path"])
+        except OSError as e:
+            return {"item": item, "error": f"cannot read image: {e}"}
+        extraction = await process_image_async(contents)
+    if "dishes" not in extraction:
+        return {"item": item, "error": "extraction failed"}
+    #--dedupe dishes listed twice on the same page
+    return {"item": item, "dishes": merge_dish_lists([extraction])["dishes"]}
+
+
+async def classify_group(group: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Classifies the dishes of several images with one batched in-process call
+    (one encode, one index search, batched LLM fallbacks) -> one output record per image.
+    """
+    extracted = [entry for entry in group if "dishes" in entry]
+    dish_names = [dish["name"] for entry in extracted for dish in entry["dishes"]]
+    batch_results = await classify_dish_batch_async(dish_names) if dish_names else []
+
+    records = []
+    offset = 0
+    for entry in group:
+        item = entry["item"]
+        if "error" in entry:
+            records.append({"id": item["id"], "path": item["path"], "status": "failed", "error": entry["error"]})
+            continue
+        dishes = entry["dishes"]
+        veg_dishes = collect_veg_dishes(dishes, batch_results[offset:offset + len(dishes)])
+        offset += len(dishes)
+        records.append({
+            "id": item["id"],
+            "path": item["path"],
+            "status": "ok",
+            "dishes_extracted": len(dishes),
+            "dishes": veg_dishes,
+            "total_price": float(sum(d["dish_price"] for d in veg_dishes)),
+        })
+    return records
+
+
+async def run_batch(
+    items: List[Dict[str, str]],
+    output_path: str,
+    concurrency: int,
+    classify_batch_images: int,
+    progress_every: int = 50,
+) -> Dict[str, Any]:
+    """
+    Extracts up to `concurrency` images at a time; finished extractions are classified in
+    groups of up to classify_batch_images while the next images are being extracted.
+    Every record is appended (and flushed) as soon as its group is classified.
+    """
+    done = load_checkpoint(output_path)
+    pending = [item for item in items if item["id"] not in done]
+    logger.info(f"{len(items)} images, {len(done)} already done, {len(pending)} to process")
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    extracted: asyncio.Queue = asyncio.Queue()
+
+    async def produce(item: Dict[str, str]):
+        await extracted.put(await extract_item(item, semaphore))
+
+    producers = [asyncio.create_task(produce(item)) for item in pending]
+    summary = {"images": 0, "failed": 0, "dishes": 0, "veg_dishes": 0}
+    start = time.perf_counter()
+    try:
+        with open(output_path, "a") as out:
+            while summary["images"] < len(pending):
+                #--whatever has been extracted so far, at least one image
+                group = [await extracted.get()]
+                while len(group) < classify_batch_images and not extracted.empty():
+                    group.append(extracted.get_nowait())
+
+                for record in await classify_group(group):
+                    out.write(json.dumps(record) + "\n")
+                    summary["images"] += 1
+                    summary["failed"] += record["status"] == "failed"
+                    summary["dishes"] += record.get("dishes_extracted", 0)
+                    summary["veg_dishes"] += len(record.get("dishes", []))
+                    if summary["images"] % progress_every == 0:
+                        logger.info(f"processed {summary['images']}/{len(pending)} images")
+                out.flush()
+                os.fsync(out.fileno())
+    finally:
+        for task in producers:
+            task.cancel()
+
+    elapsed = time.perf_counter() - start
+    summary.update({
+        "skipped": len(done),
+        "elapsed_seconds": round(elapsed, 2),
+        "images_per_min": round(summary["images"] / elapsed * 60, 2) if elapsed else None,
+        "dishes_per_sec": round(summary["dishes"] / elapsed, 2) if elapsed else None,
+    })
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    batch_config = config.get("batch") or {}
+    parser = argparse.ArgumentParser(description="Process a directory or JSONL manifest of menu images offline.")
+    parser.add_argument("source", help="Directory of menu images or JSONL manifest ({\"id\", \"path\"} per line).")
+    parser.add_argument("--output", required=True, help="JSONL results file (also the resume checkpoint).")
+    parser.add_argument("--concurrency", type=int, default=batch_config.get("concurrency", 8), help="Images extracted in parallel.")
+    parser.add_argument("--classify-batch-images", type=int, default=batch_config.get("classify_batch_images", 16),
+                        help="Max images whose dishes are classified in one batched call.")
+    args = parser.parse_args(argv)
+
+    items = list_images(args.source)
+    summary = asyncio.run(run_batch(items, args.output, args.concurrency, args.classify_batch_images))
+    print(json.dumps(summary), file=sys.stderr)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#===compare classification modes -> MCP over streamable HTTP vs in-process, same menu, same result
+# python -m mcp_modules.server                                      (in another shell, for the mcp mode)
+# python -m benchmarks.classification_mode_benchmark                (menu from temp/dish_prices_list.json)
+# python -m benchmarks.classification_mode_benchmark --concurrency 8 --requests 200
+# both modes run in this process after a warm-up call -> model loading and cold caches are excluded
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+from utils.load_config import load_config
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run_mode(mode: str, dish_prices_list: Dict[str, Any], requests: int, concurrency: int) -> Dict[str, Any]:
+    config = load_config()
+    if mode == "mcp":
+        from utils.mcp_session_pool import MCPSessionPool
+
+        pool = MCPSessionPool(
+            config["mcp_url"],
+            max_size=max(concurrency, config["mcp_pool_size"]),
+            min_size=concurrency,
+            acquire_timeout=config["mcp_pool_acquire_timeout"],
+        )
+        await pool.start()
+
+        async def classify() -> Dict[str, Any]:
+            result = await pool.call_tool("classify_sum_veg_prices", {"dishes": [dish_prices_list]})
+            return json.loads(result.content[0].text)
+    else:
+        from mcp_modules.classify_veg_dishes import classify_sum_veg_prices_async, warm_up
+
+        pool = None
+        await asyncio.to_thread(warm_up)
+
+        async def classify() -> Dict[str, Any]:
+            return await classify_sum_veg_prices_async([dish_prices_list])
+
+    try:
+        first = await classify()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+
+        async def timed_call():
+            async with semaphore:
+                start = time.perf_counter()
+                await classify()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(timed_call() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        if pool is not None:
+            await pool.close()
+
+    return {
+        "mode": mode,
+        "requests": requests,
+        "concurrency": concurrency,
+        "dishes_per_request": len(dish_prices_list["dishes"]),
+        "requests_per_s": round(requests / elapsed, 1),
+        "latency_ms_p50": round(percentile(latencies, 0.5), 2),
+        "latency_ms_p95": round(percentile(latencies, 0.95), 2),
+        #--normalized through JSON like the MCP transport -> comparable across modes
+        "result": json.loads(json.dumps(first)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare MCP and in-process classification.")
+    parser.add_argument("--menu", default="temp/dish_prices_list.json", help="Extraction JSON ({\"dishes\": [...]}) to classify.")
+    parser.add_argument("--modes", nargs="+", default=["mcp", "in_process"], choices=["mcp", "in_process"])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.menu) as f:
+        dish_prices_list = json.load(f)
+
+    rows = [asyncio.run(run_mode(mode, dish_prices_list, args.requests, args.concurrency)) for mode in args.modes]
+    results = [row.pop("result") for row in rows]
+    for row in rows:
+        row["same_result"] = all(result == results[0] for result in results)
+        print(json.dumps(row))
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#===compare embedding backends -> load time, encode throughput, single-name latency and peak RSS
+# python -m benchmarks.embedding_backend_benchmark                       (torch, onnx fp32, onnx int8)
+# python -m benchmarks.embedding_backend_benchmark --threads 1 2 4       (onnx intra-op thread sweep)
+# every configuration runs in a fresh process -> import cost and RSS are measured in isolation
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from utils.load_config import load_config
+
+#--dish names used as encode input (repeated up to --sentences)
+SAMPLE_NAMES = [
+    "paneer tikka", "butter chicken", "dal makhani", "veg biryani", "mutton rogan josh", "aloo gobi",
+    "fish curry", "palak paneer", "chicken 65", "masala dosa", "egg fried rice", "chole bhature",
+]
+
+
+def run_worker(backend: str, quantized: bool, threads: int, sentences: int, batch_size: int) -> dict:
+    config = load_config()
+    backend_config = config.get("embedding_backend") or {}
+
+    start = time.perf_counter()
+    if backend == "onnx":
+        from rag_modules.onnx_embedding import OnnxEmbeddingModel
+
+        model = OnnxEmbeddingModel(backend_config["onnx_dir"], quantized=quantized, intra_op_threads=threads)
+    else:
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(config["emb_model"], cache_folder=config.get("emb_model_cache_dir"), device="cpu")
+    load_seconds = time.perf_counter() - start
+
+    texts = [SAMPLE_NAMES[i % len(SAMPLE_NAMES)] + f" {i}" for i in range(sentences)]
+    model.encode(texts[:batch_size], batch_size=batch_size)
+
+    start = time.perf_counter()
+    model.encode(texts, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - start
+
+    latencies = []
+    for name in SAMPLE_NAMES * 5:
+        start = time.perf_counter()
+        model.encode([name])
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    return {
+        "backend": backend + ("-int8" if quantized else ""),
+        "threads": threads or "default",
+        "load_s": round(load_seconds, 2),
+        "sentences_per_s": round(sentences / batch_seconds, 1),
+        "latency_ms_p50": round(latencies[len(latencies) // 2], 2),
+        "latency_ms_p95": round(latencies[int(len(latencies) * 0.95)], 2),
+        #--ru_maxrss is reported in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "torch_imported": "torch" in sys.modules,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends.")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"], choices=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--threads", nargs="+", type=int, default=[0], help="Intra-op thread counts (0 -> library default).")
+    parser.add_argument("--sentences", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--worker", nargs=3, metavar=("BACKEND", "QUANTIZED", "THREADS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        backend, quantized, threads = args.worker
+        print(json.dumps(run_worker(backend, quantized == "1", int(threads), args.sentences, args.batch_size)))
+        return
+
+    rows = []
+    for name in args.backends:
+        backend, quantized = name.split("-")[0], name.endswith("-int8")
+        for threads in args.threads:
+            command = [
+                sys.executable, "-m", "benchmarks.embedding_backend_benchmark",
+                "--worker", backend, "1" if quantized else "0", str(threads),
+                "--sentences", str(args.sentences), "--batch-size", str(args.batch_size),
+            ]
+            result = subprocess.run(command, capture_output=True, text=True, cwd=os.getcwd())
+            if result.returncode != 0:
+                print(json.dumps({"backend": name, "threads": threads, "error": result.stderr.strip().splitlines()[-1:]}))
+                continue
+            row = json.loads(result.stdout.strip().splitlines()[-1])
+            rows.append(row)
+            print(json.dumps(row))
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#===micro-batching under synthetic concurrent load -> throughput vs added latency, per max_wait_ms
+# python -m benchmarks.embedding_batching_benchmark                              (16 callers, 1-8 names per call)
+# python -m benchmarks.embedding_batching_benchmark --callers 32 --wait-ms 1 2 5 10 --max-batch-size 128
+# every caller is a thread like the worker threads of concurrent tool calls; names are unique -> no cache effects
+import argparse
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List
+from model_instances import ModelInstances
+from mcp_modules.embedding_batcher import MicroBatchEncoder
+
+#--dish names used as encode input (made unique with a suffix)
+SAMPLE_NAMES = [
+    "paneer tikka", "butter chicken", "dal makhani", "veg biryani", "mutton rogan josh", "aloo gobi",
+    "fish curry", "palak paneer", "chicken 65", "masala dosa", "egg fried rice", "chole bhature",
+]
+
+
+def run_load(encoder, callers: int, calls: int, max_names: int, seed: int = 0) -> Dict[str, Any]:
+    latencies: List[float] = []
+    lock = threading.Lock()
+    counter = iter(range(10**9))
+
+    def caller(caller_id: int):
+        rng = random.Random(seed + caller_id)
+        for _ in range(calls):
+            names = [f"{rng.choice(SAMPLE_NAMES)} {next(counter)}" for _ in range(rng.randint(1, max_names))]
+            start = time.perf_counter()
+            encoder.encode(names)
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    names = next(counter)
+    return {
+        "names_per_s": round(names / elapsed, 1),
+        "calls_per_s": round(len(latencies) / elapsed, 1),
+        "latency_ms_p50": round(latencies[len(latencies) // 2], 2),
+        "latency_ms_p95": round(latencies[int(len(latencies) * 0.95)], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cross-request micro-batching of the embedding model.")
+    parser.add_argument("--callers", type=int, default=16, help="Concurrent callers (threads).")
+    parser.add_argument("--calls", type=int, default=50, help="Encode calls per caller.")
+    parser.add_argument("--max-names", type=int, default=8, help="Each call encodes 1..max-names dish names.")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--wait-ms", nargs="+", type=float, default=[1, 2, 5, 10])
+    args = parser.parse_args()
+
+    model = ModelInstances.get_embedding_model()
+    model.encode(SAMPLE_NAMES)
+
+    rows = []
+    configurations = [("unbatched", None)] + [(f"batched_{wait_ms:g}ms", wait_ms) for wait_ms in args.wait_ms]
+    for name, wait_ms in configurations:
+        if wait_ms is None:
+            encoder = model
+        else:
+            encoder = MicroBatchEncoder(model.encode, max_batch_size=args.max_batch_size, max_wait_ms=wait_ms)
+        row = {"mode": name, "callers": args.callers, **run_load(encoder, args.callers, args.calls, args.max_names)}
+        if wait_ms is not None:
+            stats = encoder.stats()
+            row["mean_batch_size"] = round(stats["mean_batch_size"], 1)
+            row["flushes"] = stats["flushes"]
+        rows.append(row)
+        print(json.dumps(row))
+    return rows
+
+
+if __name__ == "__main__":
+    main()
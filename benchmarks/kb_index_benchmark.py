@@ -0,0 +1,84 @@
+#===compare knowledge-base index types -> build time, recall@k vs exact search, query latency, load memory with / without mmap
+# python -m benchmarks.kb_index_benchmark                        (vectors stored by rag_modules.save_emb)
+# python -m benchmarks.kb_index_benchmark --synthetic 200000     (random vectors, knowledge base of the target size)
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import faiss
+import numpy as np
+from rag_modules.kb_index import INDEX_TYPES, kb_paths, build_index, read_index, evaluate_index
+from utils.load_config import load_config
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def load_rss_mb(path: str, mmap: bool) -> float:
+    """
+    RSS added by loading the index, measured in a fresh interpreter -> heap freed by
+    building / loading other indexes in this process cannot be reused and hide the cost.
+    """
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.kb_index_benchmark", "--load-rss", path] + (["--mmap"] if mmap else []),
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])["load_rss_mb"]
+
+
+def report_load_rss(path: str, mmap: bool):
+    #--child side of load_rss_mb
+    before = rss_mb()
+    index = read_index(path, {"mmap": mmap})
+    print(json.dumps({"load_rss_mb": round(rss_mb() - before, 1), "vectors": int(index.ntotal)}))
+
+
+def main():
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Compare knowledge-base index types.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Benchmark on N random vectors instead of the stored ones.")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--load-rss", metavar="INDEX_PATH", help=argparse.SUPPRESS)
+    parser.add_argument("--mmap", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.load_rss:
+        return report_load_rss(args.load_rss, args.mmap)
+
+    if args.synthetic:
+        vectors = np.random.default_rng(0).standard_normal((args.synthetic, args.dim)).astype("float32")
+    else:
+        vectors = np.load(kb_paths(config["knowledge_based_file_name"])["vectors"]).astype("float32")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for index_type in args.types:
+            index_config = {**(config.get("knowledge_base_index") or {}), "type": index_type}
+            start = time.perf_counter()
+            index = build_index(vectors, index_config)
+            build_seconds = time.perf_counter() - start
+            path = os.path.join(tmp_dir, f"{index_type}.index")
+            faiss.write_index(index, path)
+            del index
+
+            row = {"type": index_type, "build_s": round(build_seconds, 2), "file_mb": round(os.path.getsize(path) / 2**20, 1)}
+            for mmap in (False, True):
+                row["load_rss_mb_mmap" if mmap else "load_rss_mb"] = load_rss_mb(path, mmap)
+
+            index = read_index(path, {**index_config, "mmap": True})
+            row.update(evaluate_index(index, vectors, k=args.k, num_queries=args.queries))
+            rows.append(row)
+            print(json.dumps(row))
+
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#===benchmark image preprocessing configurations -> bytes saved, preprocess time and (optionally) extraction latency / accuracy
+# python -m benchmarks.preprocess_benchmark test_data/menu2.PNG test_data/menu2_small.PNG
+# python -m benchmarks.preprocess_benchmark test_data/menu2.PNG --extract   (calls gemini for every configuration)
+import argparse
+import io
+import json
+import time
+from PIL import Image
+from utils.helper_functions import preprocess_image, dish_key
+
+#--configurations compared against the raw upload
+CONFIGURATIONS = {
+    "raw": None,
+    "jpeg_full": {"enabled": True, "max_long_edge": None, "grayscale": "never", "format": "JPEG", "quality": 85},
+    "jpeg_1600": {"enabled": True, "max_long_edge": 1600, "grayscale": "auto", "format": "JPEG", "quality": 85},
+    "jpeg_1024": {"enabled": True, "max_long_edge": 1024, "grayscale": "auto", "format": "JPEG", "quality": 85},
+    "jpeg_1024_gray": {"enabled": True, "max_long_edge": 1024, "grayscale": "always", "format": "JPEG", "quality": 80},
+    "webp_1024": {"enabled": True, "max_long_edge": 1024, "grayscale": "auto", "format": "WEBP", "quality": 80},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare image preprocessing configurations.")
+    parser.add_argument("images", nargs="+", help="Menu image paths.")
+    parser.add_argument("--extract", action="store_true", help="Also run gemini extraction per configuration.")
+    args = parser.parse_args()
+
+    if args.extract:
+        from gemini_v0.gemini_extraction import extract_dishes_with_prices
+
+    rows = []
+    for image_path in args.images:
+        with open(image_path, "rb") as f:
+            contents = f.read()
+        baseline_keys = None
+
+        for name, preprocess_config in CONFIGURATIONS.items():
+            img = Image.open(io.BytesIO(contents))
+            model_image, stats = preprocess_image(img, preprocess_config)
+            processed_bytes = stats.get("processed_bytes", len(contents))
+            row = {
+                "image": image_path,
+                "config": name,
+                "size": list(stats.get("processed_size", img.size)),
+                "bytes": processed_bytes,
+                "bytes_saved": len(contents) - processed_bytes,
+                "preprocess_ms": round(stats.get("preprocess_ms", 0.0), 1),
+            }
+
+            if args.extract:
+                start = time.perf_counter()
+                result = extract_dishes_with_prices(model_image)
+                row["extraction_s"] = round(time.perf_counter() - start, 2)
+                keys = {dish_key(d) for d in result.get("dishes", [])}
+                row["dishes"] = len(keys)
+                #--accuracy proxy -> overlap of (name, price) pairs with the raw-image extraction
+                if baseline_keys is None:
+                    baseline_keys = keys
+                row["agreement_with_raw"] = round(len(keys & baseline_keys) / len(baseline_keys), 3) if baseline_keys else None
+
+            rows.append(row)
+            print(json.dumps(row))
+
+    return rows
+
+
+if __name__ == "__main__":
+    main()
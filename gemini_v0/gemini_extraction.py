@@ -3,29 +3,26 @@ import json
 import argparse
 import pathlib
 from PIL import Image
+from threading import Lock
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
 
 # from gemini_v0.load_gemini_model import load_gemini_model
-from model_instances import gemini_model_instance
+from model_instances import ModelInstances
+from utils.streaming_json import IncrementalArrayParser, loads_lenient
+from utils.load_config import load_config
+from utils.metrics import metrics
 from utils.logger_setup import get_logger
 
 logger = get_logger(__name__)
 
-logger.debug("calling gemini model in gemini_extraction.py")
-gemini_model = gemini_model_instance
-logger.debug("gemini model called in gemini_extraction.py")
+config = load_config()
+#--structured output, repair and retry settings of extraction responses
+parsing_config = config.get("extraction_parsing") or {}
 
-def extract_dishes_with_prices(img: Image.Image) -> dict:
-    """
-    Analyzes a menu image using the Gemini API to extract dishes with prices.
-
-    Args:
-        image_path: The file path to the menu image.
-
-    Returns:
-        A dictionary containing the extracted dishes with prices.
-    """
+metrics.describe("extraction_parse_total", "counter", "Extraction responses by parse outcome (ok, repaired, truncated, failed).")
 
-    prompt = """
+#--prompt to extract all dishes with prices from a menu image
+EXTRACTION_PROMPT = """
     Analyze the provided restaurant menu image. Your task is to extract the dishes and their corresponding prices.
 
     Return the output as a single, valid JSON object. Do not include any text or markdown formatting before or after the JSON block.
@@ -37,24 +34,268 @@ def extract_dishes_with_prices(img: Image.Image) -> dict:
     2. "price": The price of the dish (string).
     """
 
-    # Generate content
-    logger.debug("AI is analyzing the menu to extract dishes and their prices... this may take a moment.")
-    response = gemini_model.generate_content([prompt, img])
 
+#--response_schema of the schema-constrained extraction output -> same shape as EXTRACTION_PROMPT asks for
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "dishes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "price": {"type": "string"},
+                },
+                "required": ["name", "price"],
+            },
+        },
+    },
+    "required": ["dishes"],
+}
+
+
+class RetryBudget:
+    """
+    Process-wide budget of extraction retries: every extraction call deposits `ratio` of a
+    retry and every retry withdraws a whole one, up to `capacity` banked retries. Occasional
+    unparseable responses are always retried, but when the model keeps failing the retries
+    stay a bounded share (about ratio) of the calls instead of doubling the vision spend.
+    """
+
+    def __init__(self, ratio: float = 0.1, capacity: float = 5.0):
+        self.ratio = ratio
+        self.capacity = capacity
+        self.balance = capacity
+        self._lock = Lock()
+        self.spent = 0
+        self.denied = 0
+
+    @classmethod
+    def from_config(cls, parsing_config: Dict[str, Any]) -> "RetryBudget":
+        return cls(
+            ratio=parsing_config.get("retry_budget_ratio", 0.1),
+            capacity=parsing_config.get("retry_budget_capacity", 5.0),
+        )
+
+    def deposit(self):
+        with self._lock:
+            self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.balance >= 1:
+                self.balance -= 1
+                self.spent += 1
+                return True
+            self.denied += 1
+            return False
+
+    def collect_metrics(self):
+        return [
+            ("extraction_retries_total", "counter", "Extraction calls repeated because the response could not be parsed or repaired.", {}, self.spent),
+            ("extraction_retries_denied_total", "counter", "Extraction retries refused because the retry budget was exhausted.", {}, self.denied),
+            ("extraction_retry_budget_balance", "gauge", "Extraction retries currently available in the budget.", {}, self.balance),
+        ]
+
+
+retry_budget = RetryBudget.from_config(parsing_config)
+metrics.register_collector(retry_budget.collect_metrics)
+
+
+class TruncatedStreamError(ValueError):
+    """
+    Streamed extraction ended inside the dishes array -> the dishes yielded so far are
+    usable, but the extraction is incomplete and must not be cached.
+    """
+
+
+def parse_extraction_response(response) -> dict:
+    """
+    Parses the model response of an extraction call into a dict ({} on failure).
+    """
+    return parse_extraction_text(response_text(response))[0]
+
+
+def response_text(response) -> Optional[str]:
+    try:
+        return response.text
+    except (AttributeError, ValueError):
+        #--no text part (e.g. blocked response)
+        return None
+
+
+def parse_extraction_text(text: Optional[str]) -> Tuple[dict, str]:
+    """
+    Parses the text of an extraction response, repairing what models commonly get wrong:
+    prose or markdown fences around the JSON, trailing commas, a bare dishes array and a
+    truncated array (the complete dishes are kept and the result is flagged "truncated").
+    A document without a "dishes" list (e.g. {"error": "cannot read"}) counts as failed.
+
+    Returns:
+        (parsed dict, outcome) with outcome 'ok' (valid JSON), 'repaired', 'truncated' or
+        'failed' (nothing usable, parsed dict is {}).
+    """
     #---clean and parse the JSON response
     try:
-        json_string = response.text.strip()
+        json_string = text.strip()
         #---remove markdown code block fences if they exist
         if json_string.startswith("```json"):
             json_string = json_string[7:]
         if json_string.endswith("```"):
             json_string = json_string[:-3]
-        
-        return json.loads(json_string)
-    except (json.JSONDecodeError, AttributeError):
-        logger.warning("Error: Failed to parse JSON from the model's response.")
-        logger.debug("Raw response:", response.text)
+
+        data = json.loads(json_string)
+        if isinstance(data, dict) and isinstance(data.get("dishes"), list):
+            return data, "ok"
+    except (json.JSONDecodeError, AttributeError, ValueError):
+        pass
+
+    #--repair -> JSON cut out of the surrounding prose, trailing commas removed
+    data = loads_lenient(text or "")
+    if isinstance(data, list):
+        data = {"dishes": data}
+    if isinstance(data, dict) and isinstance(data.get("dishes"), list):
+        return data, "repaired"
+
+    #--broken document -> keep every complete dish object of the array
+    parser = IncrementalArrayParser("dishes")
+    dishes = parser.feed(text or "")
+    if dishes and parser.complete:
+        #--the array was closed -> nothing was cut off, only the text around it is broken
+        return {"dishes": dishes}, "repaired"
+    if dishes:
+        logger.warning(f"Extraction response was cut inside the dishes array, kept {len(dishes)} complete dishes")
+        return {"dishes": dishes, "truncated": True}, "truncated"
+
+    logger.warning("Error: Failed to parse JSON from the model's response.")
+    logger.debug(f"Raw response: {text}")
+    return {}, "failed"
+
+
+def extraction_request_kwargs() -> Dict[str, Any]:
+    """
+    generate_content keyword arguments of an extraction call -> schema-constrained JSON
+    output when extraction_parsing.structured_output is on.
+    """
+    if not parsing_config.get("structured_output", True):
         return {}
+    return {"generation_config": {"response_mime_type": "application/json", "response_schema": EXTRACTION_SCHEMA}}
+
+
+def record_parse(outcome: str):
+    metrics.inc("extraction_parse_total", outcome=outcome)
+
+
+def retry_allowed(attempt: int) -> bool:
+    """
+    True when an unparseable extraction may be requested again: within the per-call
+    max_retries and the process-wide retry budget.
+    """
+    if attempt >= parsing_config.get("max_retries", 1):
+        return False
+    if not retry_budget.try_spend():
+        logger.warning("Extraction retry budget exhausted, giving up on an unparseable response")
+        return False
+    logger.debug(f"Unparseable extraction response, retrying (attempt {attempt + 2})")
+    return True
+
+
+def extract_dishes_with_prices(img: Union[Image.Image, dict]) -> dict:
+    """
+    Analyzes a menu image using the Gemini API to extract dishes with prices.
+    A response that cannot be parsed or repaired is requested again within the retry budget.
+
+    Args:
+        img: The menu image, as a PIL image or an inline {"mime_type", "data"} blob.
+
+    Returns:
+        A dictionary containing the extracted dishes with prices ({} when nothing could be parsed).
+    """
+    # Generate content
+    logger.debug("AI is analyzing the menu to extract dishes and their prices... this may take a moment.")
+    retry_budget.deposit()
+    attempt = 0
+    while True:
+        response = ModelInstances.get_gemini_model().generate_content([EXTRACTION_PROMPT, img], **extraction_request_kwargs())
+        data, outcome = parse_extraction_text(response_text(response))
+        record_parse(outcome)
+        if outcome != "failed" or not retry_allowed(attempt):
+            return data
+        attempt += 1
+
+
+async def extract_dishes_with_prices_async(img: Union[Image.Image, dict]) -> dict:
+    """
+    Async version of extract_dishes_with_prices -> goes through the shared async Gemini
+    client (per-call timeout, bounded in-flight requests).
+
+    Args:
+        img: The menu image, as a PIL image or an inline {"mime_type", "data"} blob.
+
+    Returns:
+        A dictionary containing the extracted dishes with prices ({} when nothing could be parsed).
+    """
+    logger.debug("AI is analyzing the menu to extract dishes and their prices (async)...")
+    retry_budget.deposit()
+    attempt = 0
+    while True:
+        response = await ModelInstances.get_async_gemini_client().generate_content(
+            [EXTRACTION_PROMPT, img], **extraction_request_kwargs()
+        )
+        data, outcome = parse_extraction_text(response_text(response))
+        record_parse(outcome)
+        if outcome != "failed" or not retry_allowed(attempt):
+            return data
+        attempt += 1
+
+
+async def iter_extract_dishes_async(img: Union[Image.Image, dict]) -> AsyncIterator[dict]:
+    """
+    Streamed version of extract_dishes_with_prices_async -> yields every {"name", "price"}
+    dish as soon as its JSON object is complete in the model output, while the rest of the
+    menu is still being generated. A response without any usable dish is requested again
+    within the retry budget (nothing has been yielded at that point).
+
+    Args:
+        img: The menu image, as a PIL image or an inline {"mime_type", "data"} blob.
+
+    Yields:
+        Extracted dishes, in menu order.
+
+    Raises:
+        TruncatedStreamError: after the last complete dish, if the stream was cut inside the array.
+    """
+    logger.debug("AI is analyzing the menu to extract dishes and their prices (streamed)...")
+    retry_budget.deposit()
+    attempt = 0
+    while True:
+        parser = IncrementalArrayParser("dishes")
+        chunks = []
+        async for text in ModelInstances.get_async_gemini_client().stream_content(
+            [EXTRACTION_PROMPT, img], **extraction_request_kwargs()
+        ):
+            chunks.append(text)
+            for dish in parser.feed(text):
+                yield dish
+
+        if parser.state != "seek":
+            break
+        #--no "dishes" array found while streaming -> parse the complete text like the non-streamed call
+        data, outcome = parse_extraction_text("".join(chunks))
+        record_parse(outcome)
+        if outcome != "failed" or not retry_allowed(attempt):
+            for dish in data.get("dishes", []):
+                yield dish
+            return
+        attempt += 1
+
+    if parser.skipped:
+        logger.warning(f"Skipped {parser.skipped} malformed dishes in the extraction stream")
+    if parser.state == "array":
+        record_parse("truncated")
+        raise TruncatedStreamError(f"extraction stream ended inside the dishes array after {parser.parsed} dishes")
+    record_parse("repaired" if parser.skipped else "ok")
 
 
 # def main():
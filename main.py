@@ -2,14 +2,20 @@
 
 #=====================================================================
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from typing import List, Optional, Dict, Any, Set
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import List, Optional, Dict, Any, Set, Tuple, AsyncIterator
 import os
 import json
 from dotenv import load_dotenv
-from utils.helper_functions import process_image_sync
+from utils.helper_functions import process_image_async, iter_process_image_async, merge_dish_lists, dish_key
 import shutil
-from mcp.client.streamable_http import streamablehttp_client
-from mcp import ClientSession
+from utils.mcp_session_pool import MCPSessionPool
+from utils.metrics import metrics
+from utils.lifecycle import Readiness
+from utils.job_queue import JobStore, JobQueue, QueueFullError
+from model_instances import ModelInstances
+from utils.gemini_governor import GovernedModel
+from contextlib import asynccontextmanager
 import json
 import asyncio
 from utils.load_config import load_config
@@ -31,22 +37,153 @@ logger.debug("--------------------------------")
 load_dotenv()
 mcp_url = config["mcp_url"]
 logger.debug(f"mcp_url: {mcp_url}")
+#--'mcp' -> classification through the MCP server, 'in_process' -> same logic called directly
+classification_mode = config.get("classification_mode", "mcp")
+logger.debug(f"classification_mode: {classification_mode}")
+if classification_mode == "in_process":
+    #--only this mode runs the classifier here -> 'mcp' skips loading its models and knowledge base
+    from mcp_modules.classify_veg_dishes import (
+        classify_sum_veg_prices_async, classify_dish_batch_async, collect_veg_dishes, warm_up as warm_up_classifier,
+    )
+#--stream extraction and classify dishes while the menu is still being read (in_process mode only)
+pipeline_config = config.get("pipelined_extraction") or {}
+pipelined_extraction = pipeline_config.get("enabled", False)
+if pipelined_extraction and classification_mode != "in_process":
+    logger.warning("pipelined_extraction needs classification_mode 'in_process' -> disabled")
+    pipelined_extraction = False
+logger.debug(f"pipelined_extraction: {pipelined_extraction}")
 logger.debug("--------------------------------")
 #====================================
 
+#====================================
+#--pool of initialized MCP sessions shared across requests
+mcp_session_pool = MCPSessionPool(
+    mcp_url,
+    max_size=config["mcp_pool_size"],
+    min_size=config["mcp_pool_min_size"],
+    acquire_timeout=config["mcp_pool_acquire_timeout"],
+)
+metrics.register_collector(mcp_session_pool.collect_metrics)
+readiness = Readiness()
+metrics.describe("pipeline_classify_tail_seconds", "histogram", "Classification time left after the last dish was extracted (pipelined extraction).")
+
+
+async def process_job(payload: Tuple[List[Tuple[str, bytes]], Optional[str]]) -> Dict[str, Any]:
+    uploads, warning_message = payload
+    with metrics.span("process_images_job"):
+        return await process_uploads(uploads, warning_message)
+
+
+#--background job API (/jobs) -> bounded queue + worker pool, job state in SQLite
+jobs_config = config["jobs"]
+job_queue = JobQueue(
+    JobStore(
+        jobs_config["store_path"],
+        result_ttl_seconds=jobs_config["result_ttl_seconds"],
+        instance_id=jobs_config.get("instance_id", ""),
+    ),
+    process_job,
+    concurrency=jobs_config["concurrency"],
+    max_queue=jobs_config["max_queue"],
+    retry_after_seconds=jobs_config["retry_after_seconds"],
+    callback_timeout_seconds=jobs_config["callback_timeout_seconds"],
+    callback_allowed_schemes=jobs_config.get("callback_allowed_schemes", ["https"]),
+    callback_allowed_hosts=jobs_config.get("callback_allowed_hosts", []),
+)
+metrics.register_collector(job_queue.collect_metrics)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if classification_mode == "mcp":
+        await mcp_session_pool.start()
+    await job_queue.start()
+    #--gemini client is created here instead of at import time -> /health/ready reflects it
+    await asyncio.to_thread(readiness.run_warm_up, warm_up_models)
+    yield
+    await job_queue.close()
+    await mcp_session_pool.close()
+
+
+def warm_up_models() -> Dict[str, Any]:
+    model = ModelInstances.get_gemini_model()
+    backend = model.model if isinstance(model, GovernedModel) else model
+    details = {"gemini_backend": type(backend).__name__}
+    if classification_mode == "in_process":
+        #--embedding model + knowledge base live in this process
+        details.update(warm_up_classifier())
+    return details
+#====================================
+
 # #====================================
-app = FastAPI(title="Process restaurant menu image and return vegetarian dishes and total price")
+app = FastAPI(title="Process restaurant menu image and return vegetarian dishes and total price", lifespan=lifespan)
 # #====================================
 
 #====================================
-@app.post("/process-images")
-async def process_images(
-    images: List[UploadFile] = File(...),
-):
+async def classify_sum_veg_prices(dish_prices_list: Dict[str, Any], progress_callback=None) -> Dict[str, Any]:
+    """
+    Calls the MCP tool that classifies the dishes and sums the prices of vegetarian dishes.
+    With a progress_callback the streaming tool is used: every classified dish arrives as a
+    progress message while the call is running.
+    In the in_process classification mode the tool's logic runs directly in this process.
+    """
+    if classification_mode == "in_process":
+        return await classify_sum_veg_prices_in_process(dish_prices_list, progress_callback)
+
+    if progress_callback is None:
+        tool_name, retries = "classify_sum_veg_prices", config["mcp_call_retries"]
+    else:
+        #--no retry -> a second attempt would replay dishes that were already streamed
+        tool_name, retries = "classify_sum_veg_prices_stream", 0
+    with metrics.span("mcp_call"):
+        veg_dishes_prices_list = await mcp_session_pool.call_tool(
+            tool_name, {"dishes": [dish_prices_list]}, retries=retries, progress_callback=progress_callback
+        )
+    veg_dishes_prices_list = veg_dishes_prices_list.content[0].text
+    logger.debug(f"veg_dishes_prices_list: {veg_dishes_prices_list} and type : {type(veg_dishes_prices_list)}")
+    # #--convert to json dict
+    veg_dishes_prices_list = json.loads(veg_dishes_prices_list)
+    logger.debug(f"veg_dishes_prices_list after json loading : {veg_dishes_prices_list} and type : {type(veg_dishes_prices_list)}")
+    return veg_dishes_prices_list
+
+
+async def classify_sum_veg_prices_in_process(dish_prices_list: Dict[str, Any], progress_callback=None) -> Dict[str, Any]:
+    """
+    Same result as the MCP tools without the transport: no JSON-RPC round trip, session
+    handshake or re-parsing of the result.
+    """
+    on_classified = None
+    if progress_callback is not None:
+        num_dishes = len(dish_prices_list["dishes"])
+        progress = {"done": 0}
+
+        #--same progress messages as classify_sum_veg_prices_stream
+        async def on_classified(row: int, classification: Dict[str, Any]):
+            progress["done"] += 1
+            await progress_callback(progress["done"], num_dishes, json.dumps({"index": row, **classification}))
+
+    with metrics.span("classify_in_process"):
+        return await classify_sum_veg_prices_async([dish_prices_list], on_classified=on_classified)
+#====================================
+
+#====================================
+def veg_dish_key(name: str, price: Any) -> tuple:
+    """
+    Key to match classified veg dishes back to the images they were extracted from.
+    """
+    try:
+        price_value = float(price or 0)
+    except (TypeError, ValueError):
+        price_value = None
+    return " ".join(str(name).lower().split()), price_value
+#====================================
+
+#====================================
+async def read_uploads(images: List[UploadFile]) -> Tuple[List[Tuple[str, bytes]], Optional[str]]:
+    """
+    Reads the uploaded images (at most MAX_IMAGES) -> ([(filename, contents)], warning).
+    """
     MAX_IMAGES = config["MAX_IMAGES"]
     warning_message: Optional[str] = None
-    image_details: List[Dict[str, Any]] = []
-    total_price=None
 
     total_uploaded = len(images)
 
@@ -54,46 +191,284 @@ async def process_images(
         warning_message = f"Too many images uploaded ({total_uploaded}). Only the first {MAX_IMAGES} were processed."
         images = images[:MAX_IMAGES]
 
-    for image in images:
-        contents = await image.read()
-        
-        #--STEP 1 -> pass image to gemini and get all dishes with prices
-        dish_prices_list=process_image_sync(contents)
-        #--save to json in temp folder
-        #--check and create temp folder if not exists
-        if not os.path.exists('temp'):
-            os.makedirs('temp')
-        with open('temp/dish_prices_list.json', 'w') as f:
-            json.dump(dish_prices_list, f)
-        logger.debug(f"dish_prices_list: {dish_prices_list}")
-        logger.debug(f"type of dish_prices_list: {type(dish_prices_list)}")
-
-        # ===for local testing -> no need to call gemini again and again
-        with open('temp/dish_prices_list.json', 'r') as f:
-            dish_prices_list = json.load(f)
-            
-        logger.debug(f"dish_prices_list: in main.py file: {dish_prices_list}")
-        logger.debug(f"type of dish_prices_list: in main.py file {type(dish_prices_list)}")
-        logger.debug(f"--------------------------------")
-
-        #--STEP 2 -> filter vegetarian dishes from results
-        if dish_prices_list:
-            async with streamablehttp_client(mcp_url) as (read, write, get_session_id):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()   
-                    logger.debug("session initialized")
-                    veg_dishes_prices_list = await session.call_tool("classify_sum_veg_prices", {"dishes": [dish_prices_list]})
-                    veg_dishes_prices_list = veg_dishes_prices_list.content[0].text
-                    logger.debug(f"veg_dishes_prices_list: {veg_dishes_prices_list} and type : {type(veg_dishes_prices_list)}")
-                    # #--convert to json dict
-                    veg_dishes_prices_list = json.loads(veg_dishes_prices_list)
-                    logger.debug(f"veg_dishes_prices_list after json loading : {veg_dishes_prices_list} and type : {type(veg_dishes_prices_list)}")
-        else:
-            logger.debug(f"no dish_prices_list to filter vegetarian dishes")
-            veg_dishes_prices_list = []
-
-        return veg_dishes_prices_list
+    return [(image.filename, await image.read()) for image in images], warning_message
+
+
+async def extract_menus(uploads: List[Tuple[str, bytes]]) -> List[Dict[str, Any]]:
+    """
+    Passes all images to gemini concurrently -> one {"dishes": [...]} per image.
+    """
+    #--async gemini client keeps the event loop responsive while extractions are in flight
+    semaphore = asyncio.Semaphore(config["image_concurrency"])
+
+    async def extract_image(contents: bytes) -> Dict[str, Any]:
+        async with semaphore:
+            return await process_image_async(contents)
+
+    dish_prices_lists = await asyncio.gather(*(extract_image(contents) for _, contents in uploads))
+    logger.debug(f"dish_prices_lists: {dish_prices_lists}")
+    return dish_prices_lists
+
+
+def image_breakdown(filenames: List[str], dish_prices_lists: List[Dict[str, Any]], veg_dishes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Per-image breakdown of the combined classification result.
+    """
+    image_details: List[Dict[str, Any]] = []
+    veg_by_key = {veg_dish_key(d["dish_name"], d["dish_price"]): d for d in veg_dishes}
+    for filename, image_dish_prices in zip(filenames, dish_prices_lists):
+        image_dishes = (image_dish_prices or {}).get("dishes", [])
+        image_veg_dishes = []
+        for dish in image_dishes:
+            veg_dish = veg_by_key.get(veg_dish_key(dish.get("name", ""), dish.get("price")))
+            if veg_dish is not None and veg_dish not in image_veg_dishes:
+                image_veg_dishes.append(veg_dish)
+        image_details.append({
+            "filename": filename,
+            "dishes_extracted": len(image_dishes),
+            "veg_dishes": [d["dish_name"] for d in image_veg_dishes],
+            "total_price": float(sum(d["dish_price"] for d in image_veg_dishes)),
+        })
+    return image_details
+#====================================
+
+#====================================
+@app.post("/process-images")
+async def process_images(
+    images: List[UploadFile] = File(...),
+):
+    with metrics.span("process_images"):
+        return await _process_images(images)
+
+
+async def _process_images(images: List[UploadFile]) -> Dict[str, Any]:
+    uploads, warning_message = await read_uploads(images)
+    return await process_uploads(uploads, warning_message)
+
+
+async def process_uploads(uploads: List[Tuple[str, bytes]], warning_message: Optional[str]) -> Dict[str, Any]:
+    if pipelined_extraction:
+        with metrics.span("pipelined_extraction"):
+            dish_prices_lists, veg_dishes_prices_list = await extract_classify_pipelined(uploads)
+        return upload_result(uploads, warning_message, dish_prices_lists, veg_dishes_prices_list)
+
+    #--STEP 1 -> pass all images to gemini concurrently and get all dishes with prices
+    dish_prices_lists = await extract_menus(uploads)
+
+    #--merge and dedupe dishes across menu pages -> single classification pass
+    dish_prices_list = merge_dish_lists(dish_prices_lists)
+    logger.debug(f"merged dish_prices_list: {dish_prices_list}")
+
+    #--STEP 2 -> filter vegetarian dishes from results
+    if dish_prices_list["dishes"]:
+        veg_dishes_prices_list = await classify_sum_veg_prices(dish_prices_list)
+    else:
+        logger.debug(f"no dish_prices_list to filter vegetarian dishes")
+        veg_dishes_prices_list = {}
+
+    return upload_result(uploads, warning_message, dish_prices_lists, veg_dishes_prices_list)
+
+
+def upload_result(uploads: List[Tuple[str, bytes]], warning_message: Optional[str],
+                  dish_prices_lists: List[Dict[str, Any]], veg_dishes_prices_list: Dict[str, Any]) -> Dict[str, Any]:
+    veg_dishes = veg_dishes_prices_list.get("dishes", [])
+    total_price = veg_dishes_prices_list.get("total_price", 0.0)
+
+    #--STEP 3 -> per-image breakdown of the combined result
+    image_details = image_breakdown([filename for filename, _ in uploads], dish_prices_lists, veg_dishes)
+
+    return {
+        "dishes": veg_dishes,
+        "total_price": total_price,
+        "images": image_details,
+        "warning": warning_message,
+    }
+
+
+async def extract_classify_pipelined(uploads: List[Tuple[str, bytes]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Pipelined STEP 1 + STEP 2: every image is extracted with a streamed Gemini call and each
+    dish is queued for classification as soon as it is parsed, so classification overlaps
+    extraction and the request takes about max(extraction, classification) instead of the
+    sum. Dishes are classified in groups of classify_batch_size (one batched LLM request per
+    group for the ambiguous ones); the last partial group is sent when an image is done.
+
+    Returns:
+        (one {"dishes": [...]} per image, {"dishes": veg dishes, "total_price"}) -> the same
+        result as the sequential path, veg dishes in merged page order.
+    """
+    semaphore = asyncio.Semaphore(config["image_concurrency"])
+    batch_size = max(1, pipeline_config.get("classify_batch_size", 8))
+    seen: Set[tuple] = set()
+    pending: List[Dict[str, Any]] = []
+    classified: Dict[tuple, Dict[str, Any]] = {}
+    classify_tasks: List[asyncio.Task] = []
+
+    async def classify_group(group: List[Dict[str, Any]]):
+        results = await classify_dish_batch_async([dish["name"] for dish in group])
+        for dish, result in zip(group, results):
+            classified[dish_key(dish)] = result
+
+    def submit(flush: bool = False):
+        while len(pending) >= batch_size or (flush and pending):
+            group = pending[:batch_size]
+            del pending[:batch_size]
+            classify_tasks.append(asyncio.create_task(classify_group(group)))
+
+    async def extract_image(contents: bytes) -> Dict[str, Any]:
+        dishes: List[Dict[str, Any]] = []
+        async with semaphore:
+            async for dish in iter_process_image_async(contents):
+                dishes.append(dish)
+                #--same dedupe as merge_dish_lists -> every (name, price) is classified once
+                key = dish_key(dish)
+                if key[0] and key not in seen:
+                    seen.add(key)
+                    pending.append(dish)
+                    submit()
+        submit(flush=True)
+        return {"dishes": dishes} if dishes else {}
+
+    try:
+        dish_prices_lists = list(await asyncio.gather(*(extract_image(contents) for _, contents in uploads)))
+        logger.debug(f"dish_prices_lists: {dish_prices_lists}")
+        extracted_at = asyncio.get_running_loop().time()
+        await asyncio.gather(*classify_tasks)
+        metrics.observe("pipeline_classify_tail_seconds", asyncio.get_running_loop().time() - extracted_at)
+    finally:
+        for task in classify_tasks:
+            task.cancel()
+
+    menu_dishes = merge_dish_lists(dish_prices_lists)["dishes"]
+    if not menu_dishes:
+        logger.debug(f"no dish_prices_list to filter vegetarian dishes")
+        return dish_prices_lists, {}
+    veg_dishes = collect_veg_dishes(menu_dishes, [classified[dish_key(dish)] for dish in menu_dishes])
+    return dish_prices_lists, {
+        "dishes": veg_dishes,
+        "total_price": float(sum(d["dish_price"] for d in veg_dishes)),
+    }
+
+
+@app.post("/process-images/stream")
+async def process_images_stream(
+    images: List[UploadFile] = File(...),
+):
+    """
+    Streaming variant of /process-images (NDJSON, one event per line):
+        {"event": "dishes", ...}  -> merged extracted dishes, as soon as extraction finishes
+        {"event": "dish", ...}    -> one per classified dish (veg or not) once its decision is final
+        {"event": "total", ...}   -> vegetarian total price and per-image breakdown
+        {"event": "error", ...}   -> processing failed after the stream started
+    """
+    #--read the uploads before the response starts -> the request files are closed afterwards
+    uploads, warning_message = await read_uploads(images)
+    return StreamingResponse(stream_process_images(uploads, warning_message), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    images: List[UploadFile] = File(...),
+    callback_url: Optional[str] = Form(None),
+):
+    """
+    Queues the images for background processing and returns immediately.
+    Poll GET /jobs/{job_id}; with callback_url the finished job is also POSTed there.
+    429 + Retry-After when the queue is full.
+    """
+    uploads, warning_message = await read_uploads(images)
+    try:
+        job_id = await job_queue.submit((uploads, warning_message), callback_url=callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id.")
+    return job
+
+
+def ndjson_line(event: Dict[str, Any]) -> str:
+    return json.dumps(event) + "\n"
+
+
+async def stream_process_images(uploads: List[Tuple[str, bytes]], warning_message: Optional[str]) -> AsyncIterator[str]:
+    classify_task = None
+    try:
+        with metrics.span("extraction_stream"):
+            dish_prices_lists = await extract_menus(uploads)
+        dish_prices_list = merge_dish_lists(dish_prices_lists)
+        yield ndjson_line({"event": "dishes", "dishes": dish_prices_list["dishes"], "warning": warning_message})
+
+        veg_dishes_prices_list: Dict[str, Any] = {}
+        if dish_prices_list["dishes"]:
+            classified: asyncio.Queue = asyncio.Queue()
+
+            async def on_progress(progress: float, total: Optional[float], message: Optional[str]):
+                if message:
+                    classified.put_nowait(json.loads(message))
+
+            classify_task = asyncio.create_task(classify_sum_veg_prices(dish_prices_list, progress_callback=on_progress))
+            #--forward dishes while the MCP call is running, then whatever arrived with its result
+            while not classify_task.done():
+                next_dish = asyncio.ensure_future(classified.get())
+                await asyncio.wait({next_dish, classify_task}, return_when=asyncio.FIRST_COMPLETED)
+                if next_dish.done():
+                    yield ndjson_line({"event": "dish", **next_dish.result()})
+                else:
+                    next_dish.cancel()
+            while not classified.empty():
+                yield ndjson_line({"event": "dish", **classified.get_nowait()})
+            veg_dishes_prices_list = classify_task.result()
+
+        veg_dishes = veg_dishes_prices_list.get("dishes", [])
+        yield ndjson_line({
+            "event": "total",
+            "total_price": veg_dishes_prices_list.get("total_price", 0.0),
+            "veg_dishes": [d["dish_name"] for d in veg_dishes],
+            "images": image_breakdown([filename for filename, _ in uploads], dish_prices_lists, veg_dishes),
+        })
+    except Exception as e:
+        logger.exception("streaming /process-images failed")
+        yield ndjson_line({"event": "error", "detail": str(e)})
+    finally:
+        #--client went away mid-stream -> stop the MCP call
+        if classify_task is not None and not classify_task.done():
+            classify_task.cancel()
         
+#====================================
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/live")
+async def health_live():
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    report = readiness.report(ModelInstances.status())
+    return JSONResponse(report, status_code=200 if readiness.ready else 503)
+
+
+@app.get("/mcp-pool/stats")
+async def mcp_pool_stats():
+    return mcp_session_pool.stats()
+
+
+@app.get("/jobs-queue/stats")
+async def jobs_queue_stats():
+    return await asyncio.to_thread(job_queue.stats)
+#====================================
+
 # #==commands to run project
 # # uvicorn main:app --reload --port 9000
 # # python -m rag_modules.save_emb
@@ -1,15 +1,27 @@
-from sentence_transformers import SentenceTransformer
 import faiss
 import json
 import numpy as np
 import os
 import json
+import time
 import argparse
 import pathlib
 from PIL import Image
-from typing import Any
+from threading import Lock
+from typing import Any, AsyncIterator, Optional
+import asyncio
+from contextlib import aclosing
 # from gemini_v0.load_gemini_model import load_gemini_model
-from model_instances import gemini_model_instance
+from model_instances import ModelInstances
+from mcp_modules.label_cache import LabelCache, label_fingerprint
+from mcp_modules.embedding_cache import EmbeddingCache
+from mcp_modules.embedding_batcher import MicroBatchEncoder
+from mcp_modules.lexical_classifier import LexicalClassifier, NEUTRAL_WORDS, NON_VEG_KEYWORDS, VEG_KEYWORDS
+from rag_modules.kb_index import check_index_fingerprint, kb_paths, read_index
+from utils.metrics import metrics, cache_collector
+from utils.single_flight import SingleFlight
+from utils.gemini_governor import GeminiUnavailableError
+from utils.text_normalize import normalize_dish_name
 
 
 #---load config file
@@ -18,46 +30,145 @@ from utils.load_config import load_config
 from utils.logger_setup import get_logger
 logger = get_logger(__name__)
 
-logger.debug("calling gemini model in classify_veg_dishes.py")
-gemini_model = gemini_model_instance
-logger.debug("gemini model called in classify_veg_dishes.py")
 #====================================
 #--load config from config.yaml file
 config = load_config()
 #====================================
-emb_model_id=config['emb_model']
-emb_model = SentenceTransformer(emb_model_id)
-logger.debug(f"embedding model :{emb_model_id} loaded successfully..")
+
 #====================================
-#--loading embedding model
-index_file_path='rag_modules/' + config['knowledge_based_file_name'] + '.index'
-index = faiss.read_index(index_file_path)
+class KnowledgeBase:
+    """
+    Knowledge-base entries, the faiss index over their embeddings and the entry columns as
+    arrays (lets the decision rules run vectorized over search results), plus the
+    precompiled lexical stage (None when disabled).
+    Loaded once, on first use or by warm_up().
+    """
+
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, index, entries: list[dict], lexical_config: Optional[dict[str, Any]] = None):
+        self.index = index
+        self.entries = entries
+        self.items = np.array([e["item"].lower() for e in entries])
+        self.is_veg = np.array([bool(e["veg"]) for e in entries])
+
+        self.lexical = None
+        if lexical_config and lexical_config.get("enabled", False):
+            self.lexical = LexicalClassifier(
+                entries,
+                non_veg_keywords=NON_VEG_KEYWORDS + tuple(lexical_config.get("non_veg_keywords") or ()),
+                veg_keywords=VEG_KEYWORDS + tuple(lexical_config.get("veg_keywords") or ()),
+                neutral_words=NEUTRAL_WORDS + tuple(lexical_config.get("neutral_words") or ()),
+            )
+
+    @staticmethod
+    def get() -> "KnowledgeBase":
+        if KnowledgeBase._instance is None:
+            with KnowledgeBase._lock:
+                if KnowledgeBase._instance is None:
+                    with ModelInstances.track_loading("knowledge_base"):
+                        paths = kb_paths(config['knowledge_based_file_name'])
+                        #--vectors of another embedding model / backend would be searched silently
+                        check_index_fingerprint(paths, ModelInstances.embedding_fingerprint())
+                        #--memory-mapped when configured -> worker processes share the vectors
+                        index = read_index(paths["index"], config.get("knowledge_base_index"))
 
-json_path='rag_modules/' + config['knowledge_based_file_name'] + '.json'
-with open(json_path) as f:
-    kb = json.load(f)
+                        with open(paths["json"]) as f:
+                            kb = json.load(f)
+                        KnowledgeBase._instance = KnowledgeBase(index, kb, config.get("lexical_stage"))
+                    logger.debug(f"knowledge base loaded: {len(kb)} entries")
+        return KnowledgeBase._instance
 
+
+def warm_up() -> dict[str, float]:
+    """
+    Loads the embedding model and the knowledge base and runs a dummy encode + search, so
+    the first real request does not pay for model loading or lazy initialisation.
+    """
+    start = time.perf_counter()
+    knowledge_base = KnowledgeBase.get()
+    emb_model = ModelInstances.get_embedding_model()
+    emb = emb_model.encode(["paneer tikka"])
+    knowledge_base.index.search(np.array(emb), 1)
+    warm_up_seconds = time.perf_counter() - start
+    logger.debug(f"RAG warm-up finished in {warm_up_seconds:.2f}s")
+    return {"warm_up_seconds": warm_up_seconds}
 #====================================
+
+#====================================
+#--embeddings of normalized dish names shared across requests (None when disabled)
+embedding_cache = EmbeddingCache.from_config(config.get("embedding_cache"), fingerprint=ModelInstances.embedding_fingerprint())
+metrics.register_collector(cache_collector("embedding", embedding_cache))
+
+#--encode requests of concurrent tool calls flushed together as one model batch (None when disabled)
+embedding_batcher = MicroBatchEncoder.from_config(
+    config.get("embedding_batching"), lambda texts: ModelInstances.get_embedding_model().encode(texts)
+)
+if embedding_batcher is not None:
+    metrics.register_collector(embedding_batcher.collect_metrics)
+
+
+def encode_dish_names(dish_names: list[str]) -> np.ndarray:
+    """
+    Embeddings of the normalized dish names. Cached vectors are reused and all misses are
+    encoded in one batch (shared with concurrent callers when embedding_batching is enabled).
+
+    Args:
+        dish_names: List of dish names.
+
+    Returns:
+        float32 array of shape (len(dish_names), dim).
+    """
+    keys = [normalize_dish_name(name) for name in dish_names]
+    unique_keys = list(dict.fromkeys(keys))
+    vectors = embedding_cache.get_many(unique_keys) if embedding_cache is not None else {}
+
+    missing = [key for key in unique_keys if key not in vectors]
+    if missing:
+        encoder = embedding_batcher if embedding_batcher is not None else ModelInstances.get_embedding_model()
+        with metrics.span("embedding"):
+            encoded = np.asarray(encoder.encode(missing), dtype="float32")
+        vectors.update(zip(missing, encoded))
+        if embedding_cache is not None:
+            embedding_cache.put_many(missing, encoded)
+    return np.stack([vectors[key] for key in keys]).astype("float32")
+
+
 def rag_lookup(dish_name, top_k=2):
-    emb = emb_model.encode([dish_name])
-    D, I = index.search(np.array(emb), top_k)
-    results = [kb[i] for i in I[0]]
+    knowledge_base = KnowledgeBase.get()
+    emb = encode_dish_names([dish_name])
+    with metrics.span("faiss_search"):
+        D, I = knowledge_base.index.search(np.array(emb), top_k)
+    results = [knowledge_base.entries[i] for i in I[0] if i >= 0]
     return results
-#====================================
 
-#====================================
-def get_gemini_label(dish_name: str) -> str:
+def rag_lookup_batch(dish_names: list[str], top_k: int = 2) -> np.ndarray:
     """
-    Classifies a dish as vegetarian or non-vegetarian using the Gemini API.
+    Batched version of rag_lookup -> one encode call (cache misses only) and one index
+    search for the whole menu.
 
     Args:
-        dish_name: Name of the dish as a string.
+        dish_names: List of dish names.
+        top_k: Number of nearest knowledge-base items per dish.
 
     Returns:
-        "veg" or "non_veg"
+        Array of shape (len(dish_names), top_k) with knowledge-base row ids (-1 when an
+        approximate index found fewer than top_k neighbours).
     """
+    if not dish_names:
+        return np.empty((0, top_k), dtype=np.int64)
+    knowledge_base = KnowledgeBase.get()
+    emb = encode_dish_names(dish_names)
+    with metrics.span("faiss_search"):
+        D, I = knowledge_base.index.search(np.array(emb), top_k)
+    return I
+#====================================
+#====================================
 
-    prompt = f"""
+#====================================
+#--prompt for the LLM fallback label; part of the label cache fingerprint
+LABEL_PROMPT_TEMPLATE = """
     You are a strict vegetarian classification assistant.
 
     Classify the dish: "{dish_name}"
@@ -74,15 +185,322 @@ def get_gemini_label(dish_name: str) -> str:
     non_veg
     """
 
-    response = gemini_model.generate_content(prompt)
-    label = response.text.strip().lower()
+#--prompt for classifying all ambiguous dishes of a menu in one request
+BATCH_LABEL_PROMPT_TEMPLATE = """
+    You are a strict vegetarian classification assistant.
+
+    Classify each dish in this JSON list of {{"id", "name"}} objects:
+    {dishes_json}
+
+    Rules:
+    - The label of each dish is exactly "veg" or "non_veg".
+    - A dish is non_veg if it contains meat, chicken, mutton, fish, seafood, poultry, egg, or any non-vegetarian ingredient.
+    - Dishes containing paneer, vegetables, cheese, mushrooms, grains, lentils, or milk products are veg.
+
+    Return a single valid JSON object and nothing else, with one entry per input dish:
+    {{"labels": [{{"id": <id>, "label": "veg" or "non_veg"}}]}}
+    """
+
+#--confidence attached to LLM fallback labels
+LLM_LABEL_CONFIDENCE = 0.4
+#--confidence of ambiguous dishes decided from retrieval alone while the LLM is unavailable
+RAG_ONLY_CONFIDENCE = 0.3
+#--the model did not answer (retries exhausted, circuit open, timeout) -> degrade to RAG-only decisions
+LLM_UNAVAILABLE_ERRORS = (GeminiUnavailableError, asyncio.TimeoutError)
 
+#--persistent label cache (None when disabled), invalidated when prompts or model id change
+label_cache = LabelCache.from_config(
+    config.get("label_cache"),
+    fingerprint=label_fingerprint(LABEL_PROMPT_TEMPLATE + BATCH_LABEL_PROMPT_TEMPLATE, config["gemini_model_id"]),
+)
+
+#--concurrent requests needing the same uncached dish label share one LLM call (None when disabled)
+label_flight = SingleFlight("dish_label") if (config.get("single_flight") or {}).get("enabled", False) else None
+if label_flight is not None:
+    metrics.register_collector(label_flight.collect_metrics)
+#====================================
+
+#====================================
+def normalize_label(response_text: str) -> str:
     # Safety: normalize unexpected outputs
-    return "veg" if label.startswith("veg") else "non_veg"
+    return "veg" if response_text.strip().lower().startswith("veg") else "non_veg"
+
+
+def get_cached_label(dish_name: str):
+    if label_cache is None:
+        return None
+    cached = label_cache.get(dish_name)
+    if cached is not None:
+        logger.debug(f"label cache hit for dish : {dish_name}")
+        return cached[0]
+    return None
+
+
+def store_label(dish_name: str, label: str):
+    if label_cache is not None:
+        label_cache.put(dish_name, label, LLM_LABEL_CONFIDENCE)
+
+
+def store_labels(labels: dict[str, str]):
+    for dish_name, label in labels.items():
+        store_label(dish_name, label)
+
+
+def get_gemini_label(dish_name: str) -> str:
+    """
+    Classifies a dish as vegetarian or non-vegetarian using the Gemini API.
+    Labels are served from the persistent label cache when available.
+
+    Args:
+        dish_name: Name of the dish as a string.
+
+    Returns:
+        "veg" or "non_veg"
+    """
+    label = get_cached_label(dish_name)
+    if label is not None:
+        return label
+
+    prompt = LABEL_PROMPT_TEMPLATE.format(dish_name=dish_name)
+
+    with metrics.span("llm_label"):
+        response = ModelInstances.get_gemini_model().generate_content(prompt)
+    label = normalize_label(response.text)
+
+    store_label(dish_name, label)
+    return label
+
+
+async def get_gemini_label_async(dish_name: str) -> str:
+    """
+    Async version of get_gemini_label, using the shared async Gemini client.
+    Label cache reads and writes (SQLite, possibly waiting on another worker's lock) run
+    in a worker thread.
+    """
+    label = await asyncio.to_thread(get_cached_label, dish_name)
+    if label is not None:
+        return label
+
+    prompt = LABEL_PROMPT_TEMPLATE.format(dish_name=dish_name)
+
+    with metrics.span("llm_label"):
+        response = await ModelInstances.get_async_gemini_client().generate_content(prompt)
+    label = normalize_label(response.text)
+
+    await asyncio.to_thread(store_label, dish_name, label)
+    return label
+#====================================
+
+#====================================
+def parse_batch_labels(response_text: str, num_dishes: int) -> dict[int, str]:
+    """
+    Parses a batched label response into {id: label}.
+    Malformed or out-of-range entries are skipped so only those dishes get retried.
+    """
+    json_string = response_text.strip()
+    if json_string.startswith("```json"):
+        json_string = json_string[7:]
+    if json_string.endswith("```"):
+        json_string = json_string[:-3]
+    try:
+        entries = json.loads(json_string).get("labels", [])
+    except (json.JSONDecodeError, AttributeError):
+        logger.warning("Failed to parse batched label response from the model.")
+        return {}
+
+    labels = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        dish_id, label = entry.get("id"), str(entry.get("label", "")).strip().lower()
+        if isinstance(dish_id, int) and 0 <= dish_id < num_dishes and label in ("veg", "non_veg"):
+            labels[dish_id] = label
+    return labels
+
+
+def batch_label_prompt(chunk: list[str]) -> str:
+    dishes_json = json.dumps([{"id": i, "name": name} for i, name in enumerate(chunk)])
+    return BATCH_LABEL_PROMPT_TEMPLATE.format(dishes_json=dishes_json)
+
+
+def split_cached_labels(dish_names: list[str]) -> tuple[dict[str, str], list[str]]:
+    """
+    Returns (labels served from the label cache, unique dish names still to classify).
+    """
+    labels: dict[str, str] = {}
+    pending: list[str] = []
+    for dish_name in dict.fromkeys(dish_names):
+        label = get_cached_label(dish_name)
+        if label is not None:
+            labels[dish_name] = label
+        else:
+            pending.append(dish_name)
+    return labels, pending
+
+
+def merge_chunk_labels(chunk: list[str], chunk_labels: dict[int, str], labels: dict[str, str]) -> list[str]:
+    """
+    Adds the labels of one batch response to labels and returns the dishes it failed to label.
+    """
+    failed = []
+    for i, name in enumerate(chunk):
+        if i in chunk_labels:
+            labels[name] = chunk_labels[i]
+        else:
+            failed.append(name)
+    return failed
+
+
+def get_gemini_labels_batch(dish_names: list[str]) -> dict[str, str]:
+    """
+    Classifies several dishes with as few Gemini requests as possible.
+    Cached labels are served first, the remaining dishes are sent in chunks of
+    llm_label_batch_size, and only the items missing from a malformed batch response are
+    retried (up to llm_label_batch_retries rounds) before falling back to get_gemini_label.
+
+    Args:
+        dish_names: List of dish names.
+
+    Returns:
+        {dish_name: "veg" | "non_veg"} for every input dish.
+    """
+    labels, pending = split_cached_labels(dish_names)
+
+    batch_size = config["llm_label_batch_size"]
+    for attempt in range(config["llm_label_batch_retries"] + 1):
+        if not pending:
+            break
+        failed = []
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            try:
+                with metrics.span("llm_label_batch"):
+                    response = ModelInstances.get_gemini_model().generate_content(batch_label_prompt(chunk))
+                chunk_labels = parse_batch_labels(response.text, len(chunk))
+            except LLM_UNAVAILABLE_ERRORS:
+                raise
+            except Exception as e:
+                logger.warning(f"Batched label request failed: {e}")
+                chunk_labels = {}
+            chunk_done: dict[str, str] = {}
+            failed += merge_chunk_labels(chunk, chunk_labels, chunk_done)
+            store_labels(chunk_done)
+            labels.update(chunk_done)
+        logger.debug(f"batched label attempt {attempt}: {len(pending) - len(failed)} labelled, {len(failed)} failed")
+        pending = failed
+
+    #--items the batch could not label -> one request per dish
+    for dish_name in pending:
+        labels[dish_name] = get_gemini_label(dish_name)
+    return labels
+
+
+async def as_completed_tasks(coroutines: list) -> AsyncIterator[Any]:
+    """
+    Runs the coroutines concurrently and yields their results in completion order.
+    Tasks still running when the consumer stops iterating are cancelled.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def iter_gemini_labels_async(dish_names: list[str]) -> AsyncIterator[dict[str, str]]:
+    """
+    Async version of get_gemini_labels_batch that yields {dish_name: label} groups as soon
+    as they are final: cache hits first, then each batch response as it arrives (the chunks
+    of one round are sent concurrently), then the per-dish fallbacks. Dishes whose label is
+    already being fetched for a concurrent request wait for that call instead.
+    """
+    #--SQLite lookups in a worker thread -> a busy label cache never blocks the event loop
+    labels, pending = await asyncio.to_thread(split_cached_labels, dish_names)
+    if labels:
+        yield labels
+
+    if label_flight is None:
+        async with aclosing(fetch_gemini_labels_async(pending)) as fetched:
+            async for done in fetched:
+                yield done
+        return
+
+    #--dishes of this request per normalized name -> labels in flight for another request are awaited
+    names_by_key: dict[str, list[str]] = {}
+    for dish_name in pending:
+        names_by_key.setdefault(normalize_dish_name(dish_name), []).append(dish_name)
+
+    async def fetch_keys(keys: list[str]) -> AsyncIterator[dict[str, str]]:
+        async with aclosing(fetch_gemini_labels_async([names_by_key[key][0] for key in keys])) as fetched:
+            async for done in fetched:
+                yield {normalize_dish_name(dish_name): label for dish_name, label in done.items()}
+
+    async with aclosing(label_flight.do_many(list(names_by_key), fetch_keys)) as shared:
+        async for done in shared:
+            yield {dish_name: label for key, label in done.items() for dish_name in names_by_key[key]}
+
+
+async def fetch_gemini_labels_async(pending: list[str]) -> AsyncIterator[dict[str, str]]:
+    """
+    LLM labels for uncached dishes: batch responses as they arrive (the chunks of one round
+    are sent concurrently), then the per-dish fallbacks.
+    """
+    client = ModelInstances.get_async_gemini_client()
+
+    async def label_chunk(chunk: list[str]) -> tuple[list[str], dict[int, str]]:
+        try:
+            with metrics.span("llm_label_batch"):
+                response = await client.generate_content(batch_label_prompt(chunk))
+            return chunk, parse_batch_labels(response.text, len(chunk))
+        except LLM_UNAVAILABLE_ERRORS:
+            #--retrying per dish would only add load on an unhealthy model
+            raise
+        except Exception as e:
+            logger.warning(f"Batched label request failed: {e}")
+            return chunk, {}
+
+    batch_size = config["llm_label_batch_size"]
+    for attempt in range(config["llm_label_batch_retries"] + 1):
+        if not pending:
+            break
+        chunks = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+        failed = []
+        async for chunk, chunk_labels in as_completed_tasks([label_chunk(chunk) for chunk in chunks]):
+            chunk_done: dict[str, str] = {}
+            failed += merge_chunk_labels(chunk, chunk_labels, chunk_done)
+            if chunk_done:
+                await asyncio.to_thread(store_labels, chunk_done)
+                yield chunk_done
+        logger.debug(f"batched label attempt {attempt}: {len(pending) - len(failed)} labelled, {len(failed)} failed")
+        pending = failed
+
+    #--items the batch could not label -> one request per dish
+    async def label_single(dish_name: str) -> tuple[str, str]:
+        return dish_name, await get_gemini_label_async(dish_name)
+
+    async for dish_name, label in as_completed_tasks([label_single(dish_name) for dish_name in pending]):
+        yield {dish_name: label}
+
+
+async def get_gemini_labels_batch_async(dish_names: list[str]) -> dict[str, str]:
+    """
+    Async version of get_gemini_labels_batch; the chunks of one round are sent concurrently.
+    """
+    labels: dict[str, str] = {}
+    async for done in iter_gemini_labels_async(dish_names):
+        labels.update(done)
+    return labels
 #====================================
 
 #====================================
 def classify_single_dish(dish_name):
+    # ---- Lexical fast path: exact KB match / ingredient keyword, no embedding ----
+    lexical = lexical_decision(dish_name)
+    if lexical is not None:
+        return lexical
+
     evidence = rag_lookup(dish_name)
 
     # Count veg vs non-veg hits (global retrieval signals)
@@ -127,34 +545,315 @@ def classify_single_dish(dish_name):
         }
 
     # ---- RULE 3: Ambiguous Case → fallback to LLM classification ----
-    llm_label = get_gemini_label(dish_name)
+    try:
+        llm_label = get_gemini_label(dish_name)
+    except LLM_UNAVAILABLE_ERRORS as e:
+        logger.warning(f"LLM unavailable, deciding {dish_name} from retrieval only: {e}")
+        return rag_only_decision(evidence)
 
     is_vegetarian = (llm_label == "veg")
 
     return {
         "is_vegetarian": is_vegetarian,
-        "confidence": 0.4,
+        "confidence": LLM_LABEL_CONFIDENCE,
         "decision_reason": "Evidence ambiguous, fallback to LLM label.",
         "evidence": evidence
     }
 
 
-def classify_dishes(dishes: list[dict[str, Any]]) -> dict[str, Any]:
-    logger.debug(f'reached inside -> classify_dishes')
+#--dishes decided per rule since process start -> LLM fallback rate
+decision_counts: dict[str, int] = {}
+
+def record_decision(rule: str):
+    decision_counts[rule] = decision_counts.get(rule, 0) + 1
+
+
+def decision_collector():
+    total = sum(decision_counts.values())
+    samples = [
+        ("dish_decisions_total", "counter", "Dish classifications by deciding rule.", {"rule": rule}, count)
+        for rule, count in sorted(decision_counts.items())
+    ]
+    samples.append((
+        "llm_fallback_rate", "gauge", "Share of dishes that needed the LLM fallback.", {},
+        decision_counts.get("llm_fallback", 0) / total if total else 0.0,
+    ))
+    lexical = sum(count for rule, count in decision_counts.items() if rule.startswith("lexical_"))
+    samples.append((
+        "lexical_hit_rate", "gauge", "Share of dishes decided by the lexical stage (no embedding).", {},
+        lexical / total if total else 0.0,
+    ))
+    return samples
+
+
+metrics.register_collector(decision_collector)
+metrics.register_collector(cache_collector("label", label_cache))
+
+
+def lexical_decision(dish_name: str) -> Optional[dict[str, Any]]:
+    """
+    Classification from the lexical stage, or None when it cannot decide the dish.
+    """
+    knowledge_base = KnowledgeBase.get()
+    if knowledge_base.lexical is None:
+        return None
+    decided = knowledge_base.lexical.classify(dish_name)
+    if decided is None:
+        return None
+    rule, decision = decided
+    record_decision(rule)
+    return decision
+
+
+def staged_decisions(dish_names: list[str]) -> tuple[list[Optional[dict[str, Any]]], list[list[dict]]]:
+    """
+    Lexical stage first, batched retrieval (Rule 1 / Rule 2) only for the dishes it left
+    undecided. Same return shape as retrieval_decisions.
+    """
+    with metrics.span("lexical"):
+        decisions = [lexical_decision(name) for name in dish_names]
+    evidences = [d["evidence"] if d is not None else [] for d in decisions]
+
+    pending_rows = [row for row, d in enumerate(decisions) if d is None]
+    retrieved, retrieved_evidences = retrieval_decisions([dish_names[row] for row in pending_rows])
+    for row, decision, evidence in zip(pending_rows, retrieved, retrieved_evidences):
+        decisions[row] = decision
+        evidences[row] = evidence
+    return decisions, evidences
+
+
+def retrieval_decisions(dish_names: list[str]) -> tuple[list[Optional[dict[str, Any]]], list[list[dict]]]:
+    """
+    Rule 1 and Rule 2 of classify_single_dish, evaluated with NumPy over one batched
+    retrieval for all dishes of a menu.
+
+    Args:
+        dish_names: List of dish names.
+
+    Returns:
+        (decisions, evidences) -> decisions[row] is the classification dict, or None when
+        the dish is ambiguous (Rule 3); evidences[row] is the retrieved evidence.
+    """
+    I = rag_lookup_batch(dish_names)
+    if len(dish_names) == 0:
+        return [], []
+    knowledge_base = KnowledgeBase.get()
+
+    #--per-dish veg / non-veg hit counts (global retrieval signals), -1 slots count for neither
+    found = I >= 0
+    evidence_veg = knowledge_base.is_veg[I]
+    veg_score = (evidence_veg & found).sum(axis=1)
+    nonveg_score = (~evidence_veg & found).sum(axis=1)
+
+    #--RULE 1 -> dish name is a substring of a retrieved non-veg item
+    names_lower = np.array([name.lower() for name in dish_names])
+    name_in_item = np.char.find(knowledge_base.items[I], names_lower[:, None]) >= 0
+    direct_match_nonveg = (name_in_item & ~evidence_veg & found).any(axis=1)
+
+    #--RULE 2 -> strong majority voting
+    strong_veg = veg_score > nonveg_score + 1
+    strong_nonveg = nonveg_score > veg_score + 1
+
+    decisions = []
+    evidences = []
+    for row, dish_name in enumerate(dish_names):
+        evidence = [knowledge_base.entries[i] for i in I[row] if i >= 0]
+        evidences.append(evidence)
+        logger.debug(f"dish :{dish_name} veg_score :{veg_score[row]} nonveg_score :{nonveg_score[row]}")
+
+        if direct_match_nonveg[row]:
+            record_decision("direct_match")
+            decisions.append({
+                "is_vegetarian": False,
+                "confidence": 1.0,
+                "decision_reason": "Direct dish match indicates non-vegetarian.",
+                "evidence": evidence
+            })
+        elif strong_veg[row]:
+            record_decision("majority_veg")
+            decisions.append({
+                "is_vegetarian": True,
+                "confidence": 0.85,
+                "decision_reason": "Strong majority evidence supports vegetarian.",
+                "evidence": evidence
+            })
+        elif strong_nonveg[row]:
+            record_decision("majority_nonveg")
+            decisions.append({
+                "is_vegetarian": False,
+                "confidence": 0.85,
+                "decision_reason": "Strong majority evidence supports non-vegetarian.",
+                "evidence": evidence
+            })
+        else:
+            decisions.append(None)
+
+    return decisions, evidences
+
+
+def llm_decision(llm_label: str, evidence: list[dict]) -> dict[str, Any]:
+    #--RULE 3 -> ambiguous evidence, decision taken from the LLM label
+    record_decision("llm_fallback")
+    return {
+        "is_vegetarian": (llm_label == "veg"),
+        "confidence": LLM_LABEL_CONFIDENCE,
+        "decision_reason": "Evidence ambiguous, fallback to LLM label.",
+        "evidence": evidence
+    }
+
+
+def rag_only_decision(evidence: list[dict]) -> dict[str, Any]:
+    #--RULE 3 without the LLM -> plain majority of the retrieved evidence, a tie counts as non-veg
+    record_decision("rag_only")
+    veg_score = sum(1 for e in evidence if e["veg"])
+    return {
+        "is_vegetarian": veg_score > len(evidence) - veg_score,
+        "confidence": RAG_ONLY_CONFIDENCE,
+        "decision_reason": "LLM unavailable, decided from retrieval evidence only.",
+        "evidence": evidence
+    }
+
+
+def classify_dish_batch(dish_names: list[str]) -> list[dict[str, Any]]:
+    """
+    Classifies all dishes of a menu in one pass.
+    Same lexical stage + Rule 1/2/3 decision logic as classify_single_dish: the lexical
+    stage decides what it can, Rule 1/2 run with NumPy over one batched retrieval for the
+    rest, and Rule 3 dishes are labelled with one batched LLM request (or decided from
+    the retrieval evidence alone when the LLM is unavailable).
+
+    Args:
+        dish_names: List of dish names.
+
+    Returns:
+        List of classification dicts, in the same order as dish_names.
+    """
+    decisions, evidences = staged_decisions(dish_names)
+    try:
+        llm_labels = get_gemini_labels_batch([name for name, d in zip(dish_names, decisions) if d is None])
+    except LLM_UNAVAILABLE_ERRORS as e:
+        logger.warning(f"LLM unavailable, ambiguous dishes decided from retrieval only: {e}")
+        llm_labels = {}
+    return [
+        d if d is not None
+        else llm_decision(llm_labels[name], evidence) if name in llm_labels
+        else rag_only_decision(evidence)
+        for name, d, evidence in zip(dish_names, decisions, evidences)
+    ]
+
+
+async def iter_classify_dish_batch_async(dish_names: list[str]) -> AsyncIterator[tuple[int, dict[str, Any]]]:
+    """
+    Async version of classify_dish_batch that yields (row, classification) as soon as a
+    decision is final: lexical / retrieval decisions first, LLM fallbacks as their responses
+    arrive. The CPU-bound retrieval runs in a worker thread.
+    """
+    decisions, evidences = await asyncio.to_thread(staged_decisions, dish_names)
+    llm_rows: dict[str, list[int]] = {}
+    for row, (dish_name, decision) in enumerate(zip(dish_names, decisions)):
+        if decision is not None:
+            yield row, decision
+        else:
+            llm_rows.setdefault(dish_name, []).append(row)
+
+    labelled = set()
+    try:
+        async for labels in iter_gemini_labels_async(list(llm_rows)):
+            for dish_name, label in labels.items():
+                labelled.add(dish_name)
+                for row in llm_rows[dish_name]:
+                    yield row, llm_decision(label, evidences[row])
+    except LLM_UNAVAILABLE_ERRORS as e:
+        logger.warning(f"LLM unavailable, {len(llm_rows) - len(labelled)} dishes decided from retrieval only: {e}")
+        for dish_name, rows in llm_rows.items():
+            if dish_name not in labelled:
+                for row in rows:
+                    yield row, rag_only_decision(evidences[row])
+
+
+async def classify_dish_batch_async(dish_names: list[str]) -> list[dict[str, Any]]:
+    """
+    Async version of classify_dish_batch -> the CPU-bound retrieval runs in a worker thread
+    and the LLM fallback goes through the async Gemini client.
+    """
+    results: list[Optional[dict[str, Any]]] = [None] * len(dish_names)
+    async for row, decision in iter_classify_dish_batch_async(dish_names):
+        results[row] = decision
+    return results
+
+
+def add_dish_fields(dish: dict[str, Any], dish_classify_result: dict[str, Any]) -> dict[str, Any]:
+    dish_classify_result['dish_name']=dish['name']
+    dish_classify_result['dish_price']=float(dish.get('price', 0) or 0)
+    return dish_classify_result
+
+
+def collect_veg_dishes(menu_dishes: list[dict[str, Any]], batch_results: list[dict[str, Any]]) -> list[dict[str, Any]]:
     classification_result=[]
 
-    for dish in dishes[0]['dishes']:
-        dish_name=dish['name']
-        dish_price = float(dish.get('price', 0) or 0)
-        logger.debug(f'checking for dish : {dish_name}')
-        dish_classify_result=classify_single_dish(dish_name=dish_name)
+    for dish, dish_classify_result in zip(menu_dishes, batch_results):
+        logger.debug(f'checking for dish : {dish["name"]}')
         logger.debug(f'dish_classify_result: {dish_classify_result}')
 
         #--process only if vegetarin dish found
         if dish_classify_result['is_vegetarian']:
             logger.debug(f'veg dish found...appending to classification_result')
-            dish_classify_result['dish_name']=dish_name
-            dish_classify_result['dish_price']=dish_price
-            classification_result.append(dish_classify_result)
+            classification_result.append(add_dish_fields(dish, dish_classify_result))
 
     return classification_result
+
+
+def classify_dishes(dishes: list[dict[str, Any]]) -> dict[str, Any]:
+    logger.debug(f'reached inside -> classify_dishes')
+    menu_dishes = dishes[0]['dishes']
+    #--classify the whole menu in one batched pass
+    batch_results = classify_dish_batch([dish['name'] for dish in menu_dishes])
+    return collect_veg_dishes(menu_dishes, batch_results)
+
+
+async def classify_dishes_async(dishes: list[dict[str, Any]]) -> dict[str, Any]:
+    logger.debug(f'reached inside -> classify_dishes_async')
+    menu_dishes = dishes[0]['dishes']
+    batch_results = await classify_dish_batch_async([dish['name'] for dish in menu_dishes])
+    return collect_veg_dishes(menu_dishes, batch_results)
+
+
+async def iter_classify_dishes_async(dishes: list[dict[str, Any]]) -> AsyncIterator[tuple[int, dict[str, Any]]]:
+    """
+    Streaming version of classify_dishes_async -> yields (menu row, classification with
+    dish_name / dish_price) for every dish, veg or not, in the order decisions become final.
+    """
+    menu_dishes = dishes[0]['dishes']
+    async for row, decision in iter_classify_dish_batch_async([dish['name'] for dish in menu_dishes]):
+        yield row, add_dish_fields(menu_dishes[row], decision)
+
+
+async def classify_sum_veg_prices_async(dishes: list[dict[str, Any]], on_classified=None) -> dict[str, Any]:
+    """
+    Classifies the menu and sums the prices of its vegetarian dishes. Shared by the MCP tools
+    and the in-process classification mode of the REST app, so both return the same result.
+
+    Args:
+        dishes: [{"dishes": [{"name", "price"}, ...]}] as sent to the MCP tool.
+        on_classified: Optional coroutine function called with (menu row, classification) for
+            every dish, veg or not, as soon as its decision is final.
+
+    Returns:
+        {"dishes": vegetarian dishes in menu order, "total_price": float}, or {} without dishes.
+    """
+    if not dishes:
+        return {}
+
+    if on_classified is None:
+        veg_dishes = await classify_dishes_async(dishes=dishes)
+    else:
+        classified = {}
+        async for row, classification in iter_classify_dishes_async(dishes=dishes):
+            classified[row] = classification
+            await on_classified(row, classification)
+        veg_dishes = [classified[row] for row in sorted(classified) if classified[row]['is_vegetarian']]
+
+    return {
+        'dishes': veg_dishes,
+        "total_price": float(sum(d['dish_price'] for d in veg_dishes)),
+        }
@@ -0,0 +1,126 @@
+#===cross-request dynamic micro-batching -> encode calls from concurrent tool calls share one model batch
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+from utils.logger_setup import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+metrics.describe("embedding_batch_wait_seconds", "histogram", "Time an encode request waited for its micro-batch to be flushed.")
+
+
+class MicroBatchEncoder:
+    """
+    Queues encode requests from all threads of the process and encodes them in one batch
+    when max_batch_size texts are waiting or the oldest request has waited max_wait_ms.
+    encode() blocks its caller (a worker thread of the tool call) until its vectors are ready;
+    the model itself only runs in the batcher thread.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], Any], max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self._encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.flushes = {"full": 0, "timeout": 0}
+
+    @classmethod
+    def from_config(cls, batching_config: Optional[Dict[str, Any]], encode: Callable[[List[str]], Any]) -> Optional["MicroBatchEncoder"]:
+        if not batching_config or not batching_config.get("enabled", False):
+            return None
+        return cls(
+            encode,
+            max_batch_size=batching_config.get("max_batch_size", 64),
+            max_wait_ms=batching_config.get("max_wait_ms", 5.0),
+        )
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embeddings of texts, in order, float32 array of shape (len(texts), dim).
+        """
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((list(texts), future, time.perf_counter()))
+        return future.result()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0][0])
+            #--the window starts with the oldest request -> its added latency is bounded by max_wait_ms;
+            #--requests that queued up during the previous flush join without waiting
+            deadline = batch[0][2] + self.max_wait_seconds
+            while size < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._flush(batch, "full" if size >= self.max_batch_size else "timeout")
+
+    def _flush(self, batch: List[tuple], reason: str):
+        flush_start = time.perf_counter()
+        for _, _, queued_at in batch:
+            metrics.observe("embedding_batch_wait_seconds", flush_start - queued_at)
+
+        #--the same text asked by several requests is encoded once
+        unique_texts = list(dict.fromkeys(text for texts, _, _ in batch for text in texts))
+        try:
+            vectors = np.asarray(self._encode(unique_texts), dtype="float32") if unique_texts else None
+        except Exception as e:
+            logger.exception("micro-batch encode failed")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        row_of = {text: row for row, text in enumerate(unique_texts)}
+        for texts, future, _ in batch:
+            if texts:
+                future.set_result(vectors[[row_of[text] for text in texts]])
+            else:
+                future.set_result(np.empty((0, vectors.shape[1] if vectors is not None else 0), dtype="float32"))
+
+        self.requests += len(batch)
+        self.texts += len(unique_texts)
+        self.batches += 1
+        self.flushes[reason] += 1
+        logger.debug(f"micro-batch flushed ({reason}): {len(batch)} requests, {len(unique_texts)} texts")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "batches": self.batches,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "mean_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            "flushes": dict(self.flushes),
+        }
+
+    def collect_metrics(self):
+        stats = self.stats()
+        return [
+            ("embedding_batches_total", "counter", "Micro-batches encoded by the embedding model.", {}, stats["batches"]),
+            ("embedding_batch_requests_total", "counter", "Encode requests served through micro-batches.", {}, stats["requests"]),
+            ("embedding_batch_mean_size", "gauge", "Mean number of texts per micro-batch.", {}, stats["mean_batch_size"]),
+        ] + [
+            ("embedding_batch_flushes_total", "counter", "Micro-batch flushes by trigger.", {"reason": reason}, count)
+            for reason, count in stats["flushes"].items()
+        ]
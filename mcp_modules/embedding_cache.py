@@ -0,0 +1,190 @@
+#===dish-name embedding cache -> in-memory LRU tier + optional on-disk tier of memory-mapped float32 vectors
+import os
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional
+import numpy as np
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+#--rows added to the vector file whenever it has to grow
+GROW_ROWS = 4096
+
+
+class DiskEmbeddingStore:
+    """
+    Vectors in a flat float32 file read through np.memmap (<path>.f32), key -> row in SQLite
+    (<path>.sqlite). Rows are reused ring-buffer style once max_entries is reached.
+    Several MCP worker processes can share the files: a reused row is unpublished (its old
+    key deleted) in the same transaction that reserves it, a key is only published after its
+    vector is written, and a reader keeps a vector only if its key still maps to that row
+    after the copy.
+    """
+
+    def __init__(self, path: str, fingerprint: str, max_entries: int = 500000):
+        self.vectors_path = path + ".f32"
+        self.max_entries = max_entries
+        self.dim: Optional[int] = None
+        self._mapped: Optional[np.memmap] = None
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path + ".sqlite", timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (dish_key TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE)")
+
+        meta = dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+        if meta.get("fingerprint") != fingerprint:
+            #--other embedding model -> stored vectors are meaningless
+            if meta:
+                logger.debug("embedding cache written by another embedding model -> cleared")
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute("DELETE FROM meta")
+            self._conn.execute("INSERT INTO meta VALUES ('fingerprint', ?), ('next_row', '0')", (fingerprint,))
+            self._conn.execute("COMMIT")
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path)
+        elif "dim" in meta:
+            self.dim = int(meta["dim"])
+
+    def _map(self, rows_needed: int) -> np.memmap:
+        """
+        Memory-maps the vector file with at least rows_needed rows, growing the file if needed.
+        """
+        if self._mapped is not None and len(self._mapped) >= rows_needed:
+            return self._mapped
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if size < rows_needed * row_bytes:
+            size = min(self.max_entries, rows_needed + GROW_ROWS) * row_bytes
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(size)
+        self._mapped = np.memmap(self.vectors_path, dtype="float32", mode="r+", shape=(size // row_bytes, self.dim))
+        return self._mapped
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if self.dim is None or not keys:
+            return {}
+        found = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._select_rows(chunk)
+            if rows:
+                mapped = self._map(max(rows.values()) + 1)
+                vectors = {key: np.array(mapped[row]) for key, row in rows.items()}
+                #--a row reserved by another writer during the copy may hold a new dish's vector
+                current = self._select_rows(list(rows))
+                found.update({key: vector for key, vector in vectors.items() if current.get(key) == rows[key]})
+        return found
+
+    def _select_rows(self, keys: List[str]) -> Dict[str, int]:
+        return dict(self._conn.execute(
+            f"SELECT dish_key, row FROM embeddings WHERE dish_key IN ({','.join('?' * len(keys))})", keys
+        ).fetchall())
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        if not keys:
+            return
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+
+        #--reserve rows atomically -> concurrent writers never share a row; the keys of reused
+        #--rows are unpublished before their vectors are overwritten
+        self._conn.execute("BEGIN IMMEDIATE")
+        next_row = int(self._conn.execute("SELECT value FROM meta WHERE name = 'next_row'").fetchone()[0])
+        self._conn.execute("UPDATE meta SET value = ? WHERE name = 'next_row'", (str(next_row + len(keys)),))
+        rows = [(next_row + i) % self.max_entries for i in range(len(keys))]
+        self._conn.executemany("DELETE FROM embeddings WHERE row = ?", [(row,) for row in rows])
+        self._conn.execute("COMMIT")
+
+        mapped = self._map(max(rows) + 1)
+        for row, vector in zip(rows, vectors):
+            mapped[row] = vector
+        mapped.flush()
+
+        self._conn.execute("BEGIN IMMEDIATE")
+        self._conn.executemany("INSERT OR REPLACE INTO embeddings (dish_key, row) VALUES (?, ?)", list(zip(keys, rows)))
+        self._conn.execute("COMMIT")
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by normalized dish name. Memory LRU first, then the disk tier
+    (disk hits are promoted to memory).
+    """
+
+    def __init__(self, max_entries: int = 50000, disk: Optional[DiskEmbeddingStore] = None):
+        self.max_entries = max_entries
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = Lock()
+
+    @classmethod
+    def from_config(cls, cache_config: Optional[Dict[str, Any]], fingerprint: str) -> Optional["EmbeddingCache"]:
+        if not cache_config or not cache_config.get("enabled", False):
+            return None
+        disk = None
+        if cache_config.get("disk_path"):
+            disk = DiskEmbeddingStore(
+                cache_config["disk_path"],
+                fingerprint=fingerprint,
+                max_entries=cache_config.get("disk_max_entries", 500000),
+            )
+        return cls(max_entries=cache_config.get("max_entries", 50000), disk=disk)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Returns {key: vector} for the cached keys; the others are misses.
+        """
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.memory_hits += len(found)
+
+            pending = [key for key in keys if key not in found]
+            if self.disk is not None and pending:
+                from_disk = self.disk.get_many(pending)
+                self.disk_hits += len(from_disk)
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+                found.update(from_disk)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype="float32")
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+            if self.disk is not None:
+                self.disk.put_many(keys, vectors)
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,158 @@
+#===persistent cache of LLM dish labels, shared by all MCP worker processes on the host
+import hashlib
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+from utils.text_normalize import normalize_dish_name
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+def label_fingerprint(prompt_template: str, model_id: str) -> str:
+    """
+    Identifies the prompt + model that produced a label -> entries from another prompt or
+    model are invalid.
+    """
+    return hashlib.sha256(f"{model_id}\n{prompt_template}".encode("utf-8")).hexdigest()[:16]
+
+
+class LabelCache:
+    """
+    SQLite-backed label cache keyed on the normalized dish name.
+    WAL mode + busy timeout let several worker processes read and write the same file.
+    A hit does not write: last-access times (LRU order) are only refreshed when older than
+    touch_interval_seconds, buffered in memory and flushed by put() or at most once per interval.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fingerprint: str,
+        ttl_seconds: Optional[float] = None,
+        max_entries: int = 100000,
+        touch_interval_seconds: float = 300,
+    ):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.touch_interval_seconds = touch_interval_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        #--dish_key -> last access not yet written to the file
+        self._touches: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dish_labels (
+                dish_key TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                confidence REAL NOT NULL,
+                fingerprint TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        #--prompt or model changed since these labels were written -> drop them
+        stale = self._conn.execute("DELETE FROM dish_labels WHERE fingerprint != ?", (fingerprint,)).rowcount
+        self._conn.commit()
+        if stale:
+            logger.debug(f"label cache invalidated {stale} entries from a previous prompt/model")
+
+    @classmethod
+    def from_config(cls, cache_config: Optional[Dict[str, Any]], fingerprint: str) -> Optional["LabelCache"]:
+        if not cache_config or not cache_config.get("enabled", False):
+            return None
+        return cls(
+            path=cache_config["path"],
+            fingerprint=fingerprint,
+            ttl_seconds=cache_config.get("ttl_seconds"),
+            max_entries=cache_config.get("max_entries", 100000),
+            touch_interval_seconds=cache_config.get("touch_interval_seconds", 300),
+        )
+
+    def get(self, dish_name: str) -> Optional[Tuple[str, float]]:
+        """
+        Returns (label, confidence) for the dish, or None on a miss.
+        """
+        key = normalize_dish_name(dish_name)
+        now = time.time()
+        min_created = now - self.ttl_seconds if self.ttl_seconds else float("-inf")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT label, confidence, last_access FROM dish_labels WHERE dish_key = ? AND fingerprint = ? AND created_at >= ?",
+                (key, self.fingerprint, min_created),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if now - row[2] >= self.touch_interval_seconds:
+                self._touches[key] = now
+            if self._touches and time.monotonic() - self._last_flush >= self.touch_interval_seconds:
+                self._flush_touches()
+                self._conn.commit()
+        return row[0], row[1]
+
+    def put(self, dish_name: str, label: str, confidence: float):
+        key = normalize_dish_name(dish_name)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dish_labels (dish_key, label, confidence, fingerprint, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, label, confidence, self.fingerprint, now, now),
+            )
+            #--same write transaction -> eviction sees the latest access times
+            self._flush_touches()
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self, dish_name: Optional[str] = None):
+        """
+        Drops one dish label, or the whole cache when dish_name is None.
+        """
+        with self._lock:
+            if dish_name is None:
+                self._conn.execute("DELETE FROM dish_labels")
+            else:
+                self._conn.execute("DELETE FROM dish_labels WHERE dish_key = ?", (normalize_dish_name(dish_name),))
+            self._conn.commit()
+
+    def _flush_touches(self):
+        if self._touches:
+            self._conn.executemany(
+                "UPDATE dish_labels SET last_access = MAX(last_access, ?) WHERE dish_key = ?",
+                [(accessed, key) for key, accessed in self._touches.items()],
+            )
+            self._touches.clear()
+        self._last_flush = time.monotonic()
+
+    def _evict(self):
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM dish_labels WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM dish_labels").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM dish_labels WHERE dish_key IN "
+                "(SELECT dish_key FROM dish_labels ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,159 @@
+#===lexical fast path run before retrieval -> exact knowledge-base matches and ingredient keywords skip the embedding model
+from collections import deque
+from typing import Any, Iterable, Optional
+from utils.text_normalize import normalize_dish_name
+
+#--whole-word ingredients that make a dish non-vegetarian (normalized, plurals listed explicitly)
+NON_VEG_KEYWORDS = (
+    "chicken", "chiken", "murgh", "murg", "mutton", "motton", "lamb", "goat", "gosht", "beef", "pork",
+    "bacon", "ham", "salami", "pepperoni", "sausage", "sausages", "meat", "meatball", "meatballs",
+    "keema", "kheema", "boti", "kaleja", "nalli", "fish", "fishes", "machli", "machhi",
+    "pomfret", "pomplet", "surmai", "bangda", "rawas", "basa", "salmon", "tuna", "prawn", "prawns",
+    "shrimp", "shrimps", "jhinga", "zinga", "crab", "crabs", "khekda", "lobster", "squid", "calamari",
+    "octopus", "seafood", "oyster", "oysters", "mussel", "mussels", "clam", "clams", "egg", "eggs",
+    "anda", "omelette", "omelet", "omlet", "titar", "quail", "duck", "turkey", "non veg", "nonveg",
+)
+
+#--whole-word ingredients / markers of a vegetarian dish (only decide when no non-veg keyword matched)
+VEG_KEYWORDS = (
+    "veg", "vegetable", "vegetables", "veggie", "vegetarian", "paneer", "tofu", "aloo", "gobi",
+    "mushroom", "mushrooms", "dal", "daal", "dhal", "chana", "chole", "rajma", "palak", "bhindi",
+    "baingan", "eggplant", "brinjal", "matar", "mutter", "soya", "soy", "corn",
+    "malai kofta", "jeera rice", "khichdi", "idli", "dosa", "uttapam", "vada", "sambar",
+)
+
+#--words that say how a dish is made or served, not what is in it -> may sit next to a veg keyword
+#--("paneer butter masala"); any other unknown word sends the dish to retrieval ("corn dog")
+NEUTRAL_WORDS = (
+    "masala", "curry", "gravy", "dry", "fry", "fried", "stir", "tikka", "tandoori", "butter", "makhani",
+    "makhanwala", "kadai", "kadhai", "handi", "tadka", "tarka", "korma", "kofta", "kurma", "do", "pyaza",
+    "lababdar", "bhurji", "bhuna", "jalfrezi", "kolhapuri", "chettinad", "achari", "methi", "jeera",
+    "rice", "pulao", "biryani", "roti", "naan", "paratha", "kulcha", "thali", "sabzi", "sabji", "bhaji",
+    "pakora", "pakoda", "manchurian", "chilli", "chili", "garlic", "ginger", "onion", "tomato",
+    "cheese", "cream", "creamy", "spicy", "plain", "special", "stuffed", "mix", "mixed", "green",
+    "soup", "salad", "sandwich", "burger", "pizza", "pasta", "noodles", "roll", "wrap", "kebab",
+    "kabab", "seekh", "cutlet", "tikki", "fingers", "crispy", "baby", "and", "with", "in", "of",
+    "full", "half", "small", "large", "regular", "style", "home", "house", "chef",
+)
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over whole-word patterns -> all keyword hits of a dish name in
+    one pass over its characters, independent of the number of patterns.
+    """
+
+    def __init__(self, patterns: dict[str, Any]):
+        #--goto transitions, failure links and outputs per state
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[str, Any]]] = [[]]
+
+        for pattern, value in patterns.items():
+            state = 0
+            #--pad with spaces -> only whole words match ("egg" must not hit "eggplant")
+            for ch in f" {pattern} ":
+                if ch not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = len(self._goto) - 1
+                state = self._goto[state][ch]
+            self._out[state].append((pattern, value))
+
+        #--breadth-first failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, normalized_text: str) -> list[tuple[str, Any]]:
+        """
+        Returns (pattern, value) for every whole-word occurrence in the normalized text.
+        """
+        hits = []
+        state = 0
+        for ch in f" {normalized_text} ":
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            hits.extend(self._out[state])
+        return hits
+
+
+class LexicalClassifier:
+    """
+    Precompiled lexical stage:
+        1. hashed exact match of the normalized dish name against the knowledge-base items
+        2. keyword automaton -> any non-veg ingredient decides non_veg, otherwise a veg
+           ingredient decides veg when every other word of the name is known (veg keyword,
+           neutral cooking word or word of a veg knowledge-base item)
+    Dishes it cannot decide go on to retrieval.
+    """
+
+    def __init__(
+        self,
+        entries: list[dict],
+        non_veg_keywords: Iterable[str] = NON_VEG_KEYWORDS,
+        veg_keywords: Iterable[str] = VEG_KEYWORDS,
+        neutral_words: Iterable[str] = NEUTRAL_WORDS,
+    ):
+        self.exact: dict[str, dict] = {}
+        for entry in entries:
+            key = normalize_dish_name(entry["item"])
+            #--conflicting duplicates -> keep the non-veg entry
+            if key not in self.exact or not entry["veg"]:
+                self.exact[key] = entry
+
+        #--words a veg keyword may be combined with and still decide the dish
+        self.known_words = {
+            word
+            for text in [*veg_keywords, *neutral_words, *(entry["item"] for entry in entries if entry["veg"])]
+            for word in normalize_dish_name(text).split()
+        }
+
+        patterns = {normalize_dish_name(k): True for k in veg_keywords}
+        patterns.update({normalize_dish_name(k): False for k in non_veg_keywords})
+        self.automaton = KeywordAutomaton(patterns)
+
+    def classify(self, dish_name: str) -> Optional[tuple[str, dict[str, Any]]]:
+        """
+        Returns (rule, classification dict) for a decided dish, or None.
+        """
+        name = normalize_dish_name(dish_name)
+        entry = self.exact.get(name)
+        if entry is not None:
+            return "lexical_exact", {
+                "is_vegetarian": bool(entry["veg"]),
+                "confidence": 1.0,
+                "decision_reason": "Exact knowledge-base match.",
+                "evidence": [entry],
+            }
+
+        hits = self.automaton.find(name)
+        non_veg = sorted({pattern for pattern, is_veg in hits if not is_veg})
+        if non_veg:
+            return "lexical_non_veg_keyword", {
+                "is_vegetarian": False,
+                "confidence": 1.0,
+                "decision_reason": f"Name contains non-vegetarian ingredient: {', '.join(non_veg)}.",
+                "evidence": [{"item": word, "veg": False, "reason": "Non-vegetarian ingredient keyword."} for word in non_veg],
+            }
+
+        veg = sorted({pattern for pattern, is_veg in hits if is_veg})
+        #--an unknown word may be the actual (non-veg) ingredient -> leave the dish to retrieval
+        unknown = [word for word in name.split() if word not in self.known_words and not word.isdigit()]
+        if veg and not unknown:
+            return "lexical_veg_keyword", {
+                "is_vegetarian": True,
+                "confidence": 0.85,
+                "decision_reason": f"Name contains vegetarian ingredient: {', '.join(veg)}.",
+                "evidence": [{"item": word, "veg": True, "reason": "Vegetarian ingredient keyword."} for word in veg],
+            }
+        return None
@@ -1,41 +1,85 @@
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
 from typing import Any
+import json
 from decimal import Decimal, InvalidOperation
 from utils.logger_setup import get_logger
-from mcp_modules.classify_veg_dishes import classify_dishes
+from mcp_modules.classify_veg_dishes import classify_sum_veg_prices_async, warm_up
+from model_instances import ModelInstances
+from utils.lifecycle import Readiness
+from utils.metrics import metrics
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
 
 logger = get_logger(__name__)
 
 mcp = FastMCP("Demo-Server", stateless_http=True)
+readiness = Readiness()
+
+
+def warm_up_models() -> dict:
+    """
+    Embedding model + knowledge base + dummy inference, then the gemini client.
+    """
+    details = warm_up()
+    ModelInstances.get_gemini_model()
+    return details
 
 @mcp.tool(
     description="Classifya veg dishes and calculate the total price of vegetarian dishes. Each dish must include a 'price' field."
 )
-def classify_sum_veg_prices(dishes: list[dict[str, Any]]) -> dict[str, Any]:
+async def classify_sum_veg_prices(dishes: list[dict[str, Any]]) -> dict[str, Any]:
     
     logger.debug(f'dishes inside MCP : {dishes} and type : {type(dishes)}')
-    
-    total_price = float(0)
-    
+
+    #--classification + sum of veg prices -> same core as the in-process mode of the REST app
+    #--async path -> retrieval runs in a worker thread, LLM fallbacks don't block the server
+    with metrics.span("classify_sum_veg_prices"):
+        veg_dishes_prices_list = await classify_sum_veg_prices_async(dishes)
+    logger.debug(f'veg_dishes_prices_list inside MCP : {veg_dishes_prices_list}')
+
+    return veg_dishes_prices_list
+
+
+@mcp.tool(
+    description="Streaming variant of classify_sum_veg_prices: every classified dish (veg or not) is sent as a progress notification as soon as its decision is final; the result holds the vegetarian dishes and their total price."
+)
+async def classify_sum_veg_prices_stream(dishes: list[dict[str, Any]], ctx: Context) -> dict[str, Any]:
+
     if not dishes:
         return {}
 
-    #--STEP 1 -> perform classification
-    classification_output_list=classify_dishes(dishes=dishes)
-    logger.debug(f'classification_output_list inside MCP : {classification_output_list} and type : {type(classification_output_list)}')
+    #--progress message -> JSON of {"index": menu row, **classification}
+    num_dishes = len(dishes[0]['dishes'])
+    progress = {"done": 0}
+
+    async def report(row: int, classification: dict[str, Any]):
+        progress["done"] += 1
+        await ctx.report_progress(progress["done"], num_dishes, message=json.dumps({"index": row, **classification}))
+
+    with metrics.span("classify_sum_veg_prices_stream"):
+        return await classify_sum_veg_prices_async(dishes, on_classified=report)
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@mcp.custom_route("/health/live", methods=["GET"])
+async def health_live(request: Request) -> JSONResponse:
+    return JSONResponse({"status": "alive"})
 
-    #--get sum of all prices
-    if classification_output_list:
-        for sample_dish_items in classification_output_list:
-            total_price+=sample_dish_items['dish_price']
 
-    return {
-        'dishes':classification_output_list,
-        "total_price": float(total_price)
-        }
+@mcp.custom_route("/health/ready", methods=["GET"])
+async def health_ready(request: Request) -> JSONResponse:
+    #--503 until warm-up finished -> orchestrator holds traffic back from a cold server
+    report = readiness.report(ModelInstances.status())
+    return JSONResponse(report, status_code=200 if readiness.ready else 503)
 
 
 if __name__ == "__main__":
+    #--models load in the background, the port is bound right away for liveness probes
+    readiness.start_background_warm_up(warm_up_models)
     mcp.run(
         transport="streamable-http",
     )
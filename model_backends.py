@@ -0,0 +1,284 @@
+# model_backends.py
+#===pluggable stand-ins for the Gemini model -> offline benchmarking / load testing of the RAG, MCP and HTTP layers
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import time
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from PIL import Image
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+#--words that make the fake backend label a dish non_veg
+NON_VEG_KEYWORDS = (
+    "chicken", "chiken", "mutton", "lamb", "beef", "pork", "fish", "prawn", "shrimp", "crab",
+    "egg", "omelette", "omlet", "keema", "kheema", "boti", "meat", "seafood", "bacon", "ham",
+    "motton", "titar", "khekda", "zinga", "pomplet", "kaleja",
+)
+
+
+class BackendResponse:
+    """
+    Minimal stand-in for a Gemini response -> callers only use .text
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class BackendStream:
+    """
+    Minimal stand-in for a streamed Gemini response (generate_content_async(..., stream=True))
+    -> async iteration over chunks with .text. The response text is sent in chunk_chars pieces,
+    latency_seconds spread evenly over them to mimic tokens being generated.
+    """
+
+    def __init__(self, text: str, latency_seconds: float = 0.0, chunk_chars: int = 120):
+        self.text = text
+        self.latency_seconds = latency_seconds
+        self.chunk_chars = max(1, chunk_chars)
+
+    async def __aiter__(self):
+        chunks = [self.text[i:i + self.chunk_chars] for i in range(0, len(self.text), self.chunk_chars)] or [""]
+        for chunk in chunks:
+            if self.latency_seconds:
+                await asyncio.sleep(self.latency_seconds / len(chunks))
+            yield BackendResponse(chunk)
+
+
+def chunk_text(chunk) -> str:
+    """
+    Text of one streamed chunk; live chunks without text parts (e.g. the final one carrying
+    only the finish reason) raise on .text -> empty string.
+    """
+    try:
+        return chunk.text or ""
+    except (AttributeError, ValueError):
+        return ""
+
+
+def contents_parts(contents) -> List[Any]:
+    return list(contents) if isinstance(contents, (list, tuple)) else [contents]
+
+
+def contents_key(contents) -> str:
+    """
+    Stable hash of a request (prompt text + image bytes) used to record / replay responses.
+    """
+    digest = hashlib.sha256()
+    for part in contents_parts(contents):
+        if isinstance(part, str):
+            digest.update(b"text:" + part.encode("utf-8"))
+        elif isinstance(part, dict) and "data" in part:
+            digest.update(b"blob:" + part["data"])
+        elif isinstance(part, Image.Image):
+            buffer = io.BytesIO()
+            part.save(buffer, format="PNG")
+            digest.update(b"image:" + buffer.getvalue())
+        else:
+            digest.update(repr(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def fake_label(dish_name: str) -> str:
+    name = dish_name.lower()
+    return "non_veg" if any(word in name for word in NON_VEG_KEYWORDS) else "veg"
+
+
+class InjectedFault(Exception):
+    """
+    Error raised by the fake backend, with the HTTP status of the google.api_core error it imitates.
+    """
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message} (injected)")
+        self.code = code
+
+
+#--fault name -> (HTTP status, message) raised by the fake backend
+FAULTS = {
+    "throttle": (429, "Resource has been exhausted (e.g. check quota)."),
+    "unavailable": (503, "The service is currently unavailable."),
+}
+
+
+#--ways the fake backend damages an extraction response (fault_injection.malformed_rate)
+MALFORMED_KINDS = ("prose", "trailing_comma", "truncated", "unparseable")
+
+
+class FakeGeminiModel:
+    """
+    Deterministic offline model.
+    Image requests return the canned extraction, label prompts are answered with a keyword
+    rule, and every call waits latency_seconds to mimic the network round-trip.
+    Optional fault injection: a share of calls fails with 429 / 503 or hangs for hang_seconds,
+    a share of extraction responses comes back malformed. Keyword arguments such as
+    generation_config are accepted and ignored (the canned output already matches the schema).
+    Streamed calls (stream=True) spread latency_seconds over the chunks of the response.
+    """
+
+    def __init__(self, extraction_response_path: Optional[str] = None, latency_seconds: float = 0.0,
+                 faults: Optional[Dict[str, Any]] = None, stream_chunk_chars: int = 120):
+        self.latency_seconds = latency_seconds
+        self.stream_chunk_chars = stream_chunk_chars
+        self.faults = faults or {}
+        self._random = random.Random(self.faults.get("seed"))
+        self.extraction_text = json.dumps({"dishes": []})
+        if extraction_response_path and os.path.exists(extraction_response_path):
+            with open(extraction_response_path) as f:
+                self.extraction_text = json.dumps(json.load(f))
+
+    def respond(self, contents) -> BackendResponse:
+        parts = contents_parts(contents)
+        prompt = "\n".join(part for part in parts if isinstance(part, str))
+
+        #--image attached -> extraction request
+        if len(parts) > 1 or not isinstance(parts[0], str):
+            if self._random.random() < self.faults.get("malformed_rate", 0.0):
+                return BackendResponse(self.malformed(self.extraction_text))
+            return BackendResponse(self.extraction_text)
+
+        #--batched label request -> {"labels": [{"id", "label"}]}
+        if '"labels"' in prompt:
+            match = re.search(r"(\[\s*\{.*?\}\s*\])", prompt, re.DOTALL)
+            dishes = json.loads(match.group(1)) if match else []
+            labels = [{"id": d["id"], "label": fake_label(d["name"])} for d in dishes]
+            return BackendResponse(json.dumps({"labels": labels}))
+
+        #--single dish label request
+        match = re.search(r'Classify the dish: "(.*)"', prompt)
+        return BackendResponse(fake_label(match.group(1) if match else prompt))
+
+    def malformed(self, text: str) -> str:
+        """
+        The extraction text damaged the way model output goes wrong: wrapped in prose and
+        fences, trailing commas, cut off mid-array, or not JSON at all (unrepairable).
+        """
+        kind = self._random.choice(MALFORMED_KINDS)
+        if kind == "prose":
+            return f"Here are the dishes I found on the menu:\n```json\n{text}\n```\nLet me know if you need more."
+        if kind == "trailing_comma":
+            return text.replace("}", ",}").replace("]", ",]")
+        if kind == "truncated":
+            return text[:max(1, int(len(text) * self._random.uniform(0.3, 0.9)))]
+        return "I could not read the prices on this menu clearly."
+
+    def draw_fault(self) -> Optional[str]:
+        """
+        'throttle', 'unavailable', 'hang' or None, drawn with the configured rates.
+        """
+        draw = self._random.random()
+        for fault in ("throttle", "unavailable", "hang"):
+            rate = self.faults.get(f"{fault}_rate", 0.0)
+            if draw < rate:
+                return fault
+            draw -= rate
+        return None
+
+    def generate_content(self, contents, **kwargs) -> BackendResponse:
+        fault = self.draw_fault()
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if fault == "hang":
+            time.sleep(self.faults.get("hang_seconds", 30.0))
+        elif fault is not None:
+            raise InjectedFault(*FAULTS[fault])
+        return self.respond(contents)
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        fault = self.draw_fault()
+        if self.latency_seconds and not stream:
+            await asyncio.sleep(self.latency_seconds)
+        if fault == "hang":
+            await asyncio.sleep(self.faults.get("hang_seconds", 30.0))
+        elif fault is not None:
+            raise InjectedFault(*FAULTS[fault])
+        response = self.respond(contents)
+        if stream:
+            return BackendStream(response.text, self.latency_seconds, self.stream_chunk_chars)
+        return response
+
+
+class RecordingModel:
+    """
+    Wraps the real model and appends every (request hash, response text) pair to a JSONL file.
+    """
+
+    def __init__(self, model, recording_path: str):
+        self.model = model
+        self.recording_path = recording_path
+        self._lock = Lock()
+        if os.path.dirname(recording_path):
+            os.makedirs(os.path.dirname(recording_path), exist_ok=True)
+
+    def record(self, contents, response):
+        #--tolerant accessor -> a blocked / empty response is recorded as "" instead of raising,
+        #--the caller handles it exactly like on the live backend
+        self.record_text(contents, chunk_text(response))
+
+    def record_text(self, contents, text: str):
+        line = json.dumps({"key": contents_key(contents), "text": text})
+        with self._lock:
+            with open(self.recording_path, "a") as f:
+                f.write(line + "\n")
+
+    def generate_content(self, contents, **kwargs):
+        response = self.model.generate_content(contents, **kwargs)
+        self.record(contents, response)
+        return response
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        response = await self.model.generate_content_async(contents, stream=stream, **kwargs)
+        if stream:
+            return self.record_stream(contents, response)
+        self.record(contents, response)
+        return response
+
+    async def record_stream(self, contents, response):
+        #--recorded once the stream is complete -> replay serves the full text
+        chunks = []
+        async for chunk in response:
+            chunks.append(chunk_text(chunk))
+            yield chunk
+        self.record_text(contents, "".join(chunks))
+
+
+class ReplayModel:
+    """
+    Serves responses captured by RecordingModel, fully offline.
+    """
+
+    def __init__(self, recording_path: str, latency_seconds: float = 0.0, stream_chunk_chars: int = 120):
+        self.latency_seconds = latency_seconds
+        self.stream_chunk_chars = stream_chunk_chars
+        self.responses: Dict[str, str] = {}
+        with open(recording_path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.responses[entry["key"]] = entry["text"]
+        logger.debug(f"loaded {len(self.responses)} recorded responses from {recording_path}")
+
+    def respond(self, contents) -> BackendResponse:
+        key = contents_key(contents)
+        if key not in self.responses:
+            raise KeyError(f"No recorded response for request {key[:12]}... -> record it first with model_backend.type 'record'")
+        return BackendResponse(self.responses[key])
+
+    def generate_content(self, contents, **kwargs) -> BackendResponse:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self.respond(contents)
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs):
+        if stream:
+            return BackendStream(self.respond(contents).text, self.latency_seconds, self.stream_chunk_chars)
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self.respond(contents)
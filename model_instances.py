@@ -1,9 +1,16 @@
 # model_instances.py
 import os
+import time
+import asyncio
+import weakref
+from contextlib import contextmanager
+from typing import AsyncIterator
 from threading import Lock
 from dotenv import load_dotenv
-import google.generativeai as genai
+from model_backends import FakeGeminiModel, RecordingModel, ReplayModel, chunk_text
+from utils.gemini_governor import GeminiGovernor, GovernedModel
 from utils.load_config import load_config
+from utils.metrics import metrics
 from utils.logger_setup import get_logger
 
 # --- Initialize logger ---
@@ -20,41 +27,247 @@ class ModelInstances:
     """
 
     _gemini_model = None
+    _embedding_model = None
     _lock = Lock()
+    _embedding_lock = Lock()
+    #--loading state of every model / artifact -> readiness endpoints
+    _status = {}
+
+    @staticmethod
+    @contextmanager
+    def track_loading(name: str):
+        """
+        Records state ('loading' -> 'ready' / 'failed') and load time of a model.
+        """
+        ModelInstances._status[name] = {"state": "loading"}
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            ModelInstances._status[name] = {"state": "failed", "error": str(e)}
+            raise
+        ModelInstances._status[name] = {"state": "ready", "load_seconds": round(time.perf_counter() - start, 3)}
+
+    @staticmethod
+    def status() -> dict:
+        return {name: dict(state) for name, state in ModelInstances._status.items()}
 
     @staticmethod
     def get_gemini_model():
         """
         Loads and returns a singleton instance of the Gemini model.
-        Reads model ID from config.yaml and uses GEMINI_API_KEY from environment.
+        The backend is selected by model_backend.type in config.yaml:
+            'gemini' -> live API (model ID from config.yaml, GEMINI_API_KEY from environment)
+            'fake'   -> deterministic offline stand-in with canned responses
+            'record' -> live API, every response appended to model_backend.recording_path
+            'replay' -> offline, serves the responses captured in 'record' mode
+        With gemini_governor.enabled the backend is wrapped in a GovernedModel (token bucket,
+        adaptive concurrency, retries with backoff, circuit breaker).
         """
         if ModelInstances._gemini_model is None:
             with ModelInstances._lock:
                 if ModelInstances._gemini_model is None:
-                    logger.debug("Loading Gemini model for the first time...")
+                    backend_config = config.get("model_backend") or {}
+                    backend = backend_config.get("type", "gemini")
+                    logger.debug(f"Loading Gemini model for the first time (backend: {backend})...")
 
-                    # --- Validate API key ---
-                    api_key = os.getenv("GEMINI_API_KEY")
-                    if not api_key:
-                        raise EnvironmentError("The 'GEMINI_API_KEY' environment variable is not set.")
-
-                    # --- Configure Gemini client ---
-                    genai.configure(api_key=api_key)
-
-                    # --- Load model ID from config ---
-                    gemini_model_id = config["gemini_model_id"]
-                    logger.debug(f"Using Gemini model ID: {gemini_model_id}")
-
-                    # --- Create model instance ---
-                    ModelInstances._gemini_model = genai.GenerativeModel(gemini_model_id)
+                    with ModelInstances.track_loading("gemini"):
+                        model = ModelInstances._build_gemini_backend(backend, backend_config)
+                        #--rate limiting, retries and circuit breaking shared by every caller in the process
+                        governor = GeminiGovernor.from_config(config.get("gemini_governor"))
+                        if governor is not None:
+                            metrics.register_collector(governor.collect_metrics)
+                            model = GovernedModel(model, governor, config["gemini_governor"].get("attempt_timeout_seconds"))
+                        ModelInstances._gemini_model = model
                     logger.debug("Gemini model loaded successfully.")
         else:
             logger.debug("Reusing already loaded Gemini model instance.")
 
         return ModelInstances._gemini_model
 
+    @staticmethod
+    def _build_gemini_backend(backend: str, backend_config: dict):
+        if backend == "fake":
+            return FakeGeminiModel(
+                extraction_response_path=backend_config.get("fake_extraction_path"),
+                latency_seconds=backend_config.get("latency_seconds", 0.0),
+                faults=backend_config.get("fault_injection"),
+                stream_chunk_chars=backend_config.get("stream_chunk_chars", 120),
+            )
+        if backend == "replay":
+            return ReplayModel(
+                backend_config["recording_path"],
+                latency_seconds=backend_config.get("latency_seconds", 0.0),
+                stream_chunk_chars=backend_config.get("stream_chunk_chars", 120),
+            )
+        if backend in ("gemini", "record"):
+            model = ModelInstances._load_gemini_model()
+            if backend == "record":
+                model = RecordingModel(model, backend_config["recording_path"])
+            return model
+        raise ValueError(f"Unknown model_backend type: {backend}")
+
+    @staticmethod
+    def get_embedding_model():
+        """
+        Loads and returns a singleton instance of the embedding model.
+        The backend is selected by embedding_backend.type in config.yaml:
+            'torch' -> SentenceTransformer on PyTorch
+            'onnx'  -> exported model on onnxruntime (optionally int8), torch is never imported
+        Imported lazily -> processes that never embed (REST app) don't pay for either.
+        Set HF_HUB_OFFLINE=1 to load only from the baked-in emb_model_cache_dir.
+        """
+        if ModelInstances._embedding_model is None:
+            with ModelInstances._embedding_lock:
+                if ModelInstances._embedding_model is None:
+                    backend_config = config.get("embedding_backend") or {}
+                    backend = backend_config.get("type", "torch")
+                    emb_model_id = config["emb_model"]
+                    with ModelInstances.track_loading("embedding_model"):
+                        if backend == "onnx":
+                            from rag_modules.onnx_embedding import OnnxEmbeddingModel
+
+                            ModelInstances._embedding_model = OnnxEmbeddingModel(
+                                backend_config["onnx_dir"],
+                                quantized=backend_config.get("quantized", False),
+                                intra_op_threads=backend_config.get("intra_op_threads", 0),
+                            )
+                        elif backend == "torch":
+                            from sentence_transformers import SentenceTransformer
+
+                            ModelInstances._embedding_model = SentenceTransformer(
+                                emb_model_id, cache_folder=config.get("emb_model_cache_dir")
+                            )
+                        else:
+                            raise ValueError(f"Unknown embedding_backend type: {backend}")
+                    logger.debug(f"embedding model :{emb_model_id} ({backend}) loaded successfully..")
+        return ModelInstances._embedding_model
+
+    @staticmethod
+    def embedding_fingerprint() -> str:
+        """
+        Identifies the vectors the configured embedding model produces -> cached / stored
+        embeddings from another model or backend are not reused.
+        """
+        backend_config = config.get("embedding_backend") or {}
+        backend = backend_config.get("type", "torch")
+        if backend == "onnx" and backend_config.get("quantized", False):
+            backend = "onnx-int8"
+        return f"{config['emb_model']}:{backend}"
+
+    @staticmethod
+    def _load_gemini_model():
+        import google.generativeai as genai
+
+        # --- Validate API key ---
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise EnvironmentError("The 'GEMINI_API_KEY' environment variable is not set.")
 
-# === Load Gemini model at import time ===
-logger.debug("Initializing and caching Gemini model instance...")
-gemini_model_instance = ModelInstances.get_gemini_model()
-logger.debug("Gemini model is ready for reuse.")
\ No newline at end of file
+        # --- Configure Gemini client ---
+        genai.configure(api_key=api_key)
+
+        # --- Load model ID from config ---
+        gemini_model_id = config["gemini_model_id"]
+        logger.debug(f"Using Gemini model ID: {gemini_model_id}")
+
+        # --- Create model instance ---
+        return genai.GenerativeModel(gemini_model_id)
+
+    _async_gemini_client = None
+
+    @staticmethod
+    def get_async_gemini_client():
+        """
+        Returns the shared async access layer on top of the Gemini model.
+        Timeout and in-flight limit are read from config.yaml.
+        """
+        if ModelInstances._async_gemini_client is None:
+            with ModelInstances._lock:
+                if ModelInstances._async_gemini_client is None:
+                    ModelInstances._async_gemini_client = AsyncGeminiClient(
+                        ModelInstances.get_gemini_model,
+                        max_in_flight=config["gemini_max_in_flight"],
+                        timeout=config["gemini_timeout_seconds"],
+                    )
+        return ModelInstances._async_gemini_client
+
+
+class AsyncGeminiClient:
+    """
+    Async generate calls on the shared Gemini model.
+    Every call gets a timeout and the number of in-flight requests is bounded, so one
+    process can serve many requests concurrently without flooding the API.
+    On a governed model the in-flight slot is taken per attempt inside the governor (never
+    held through its queueing and backoff), and the timeout is raised to the worst-case
+    retry schedule so it does not cut retries short.
+    """
+
+    def __init__(self, model_getter, max_in_flight: int = 8, timeout: float = 60.0):
+        self._model_getter = model_getter
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        #--asyncio primitives are bound to one event loop -> one semaphore per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        return semaphore
+
+    def _call_timeout(self, model, timeout: float = None) -> float:
+        timeout = timeout or self.timeout
+        if isinstance(model, GovernedModel):
+            return max(timeout, model.retry_schedule_seconds() or 0)
+        return timeout
+
+    async def generate_content(self, contents, timeout: float = None, **kwargs):
+        """
+        Async equivalent of GenerativeModel.generate_content.
+
+        Raises:
+            asyncio.TimeoutError: if the model does not answer within the timeout.
+        """
+        model = self._model_getter()
+        if isinstance(model, GovernedModel):
+            return await asyncio.wait_for(
+                model.generate_content_async(contents, slot=self._semaphore(), **kwargs),
+                timeout=self._call_timeout(model, timeout),
+            )
+        async with self._semaphore():
+            return await asyncio.wait_for(
+                model.generate_content_async(contents, **kwargs),
+                timeout=self._call_timeout(model, timeout),
+            )
+
+    async def stream_content(self, contents, timeout: float = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Streamed generate call -> yields the response text chunk by chunk as the model
+        produces it. The in-flight slot is held and the timeout applies until the stream ends;
+        the governor (if enabled) retries opening the stream, not a stream that broke midway.
+
+        Raises:
+            asyncio.TimeoutError: if the stream is not complete within the timeout.
+        """
+        model = self._model_getter()
+        semaphore = self._semaphore()
+        async with asyncio.timeout(self._call_timeout(model, timeout)):
+            if isinstance(model, GovernedModel):
+                #--the slot comes back held by the attempt that opened the stream
+                response = await model.generate_content_async(contents, stream=True, slot=semaphore, **kwargs)
+            else:
+                await semaphore.acquire()
+                try:
+                    response = await model.generate_content_async(contents, stream=True, **kwargs)
+                except BaseException:
+                    semaphore.release()
+                    raise
+            try:
+                async for chunk in response:
+                    text = chunk_text(chunk)
+                    if text:
+                        yield text
+            finally:
+                semaphore.release()
@@ -0,0 +1,240 @@
+#===knowledge-base vector store + faiss index: incremental embedding, ANN index types, memory-mapped loading
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import faiss
+import numpy as np
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+#--faiss wants at least ~39 training points per IVF cluster
+MIN_POINTS_PER_CLUSTER = 39
+
+
+def kb_paths(knowledge_based_file_name: str, directory: str = "rag_modules") -> Dict[str, str]:
+    base = os.path.join(directory, knowledge_based_file_name)
+    return {
+        "json": base + ".json",
+        "index": base + ".index",
+        #--embedding fingerprint the index was built with
+        "index_meta": base + ".index.json",
+        #--row-aligned float32 embeddings of the json entries + the key of every row
+        "vectors": base + ".vectors.npy",
+        "vector_keys": base + ".vectors.json",
+    }
+
+
+def entry_key(entry: Dict[str, Any], emb_model_id: str) -> str:
+    """
+    Identifies the embedding of an entry -> changes when the item text or the model changes.
+    """
+    return hashlib.sha256(f"{emb_model_id}\n{entry['item']}".encode("utf-8")).hexdigest()
+
+
+def load_vector_store(paths: Dict[str, str]) -> Dict[str, np.ndarray]:
+    """
+    Previously computed embeddings keyed by entry_key (memory-mapped, rows are copied on use).
+    """
+    if not os.path.exists(paths["vectors"]) or not os.path.exists(paths["vector_keys"]):
+        return {}
+    with open(paths["vector_keys"]) as f:
+        keys = json.load(f)["keys"]
+    vectors = np.load(paths["vectors"], mmap_mode="r")
+    if len(keys) != len(vectors):
+        logger.debug("vector store keys and rows disagree -> ignoring the stored vectors")
+        return {}
+    return {key: vectors[row] for row, key in enumerate(keys)}
+
+
+def embed_entries(
+    entries: List[Dict[str, Any]],
+    encode: Callable[[List[str]], np.ndarray],
+    emb_model_id: str,
+    previous: Optional[Dict[str, np.ndarray]] = None,
+    batch_size: int = 256,
+) -> Tuple[np.ndarray, List[str], Dict[str, int]]:
+    """
+    Row-aligned embeddings of the entries; only entries whose key is not in `previous`
+    are encoded.
+
+    Returns:
+        (vectors, keys, stats) with stats = {"reused", "embedded"}
+    """
+    previous = previous or {}
+    keys = [entry_key(entry, emb_model_id) for entry in entries]
+    missing_rows = [row for row, key in enumerate(keys) if key not in previous]
+
+    new_vectors: Dict[int, np.ndarray] = {}
+    for start in range(0, len(missing_rows), batch_size):
+        rows = missing_rows[start:start + batch_size]
+        encoded = np.asarray(encode([entries[row]["item"] for row in rows]), dtype="float32")
+        new_vectors.update(zip(rows, encoded))
+        logger.debug(f"embedded {start + len(rows)}/{len(missing_rows)} new or changed entries")
+
+    if not entries:
+        return np.empty((0, 0), dtype="float32"), keys, {"reused": 0, "embedded": 0}
+    vectors = np.stack([
+        new_vectors[row] if row in new_vectors else np.asarray(previous[key], dtype="float32")
+        for row, key in enumerate(keys)
+    ]).astype("float32")
+    return vectors, keys, {"reused": len(entries) - len(missing_rows), "embedded": len(missing_rows)}
+
+
+def save_vector_store(paths: Dict[str, str], vectors: np.ndarray, keys: List[str], emb_model_id: str):
+    #--write to temp files and swap -> the old store may still be memory-mapped by a reader
+    tmp_vectors = paths["vectors"] + ".tmp.npy"
+    np.save(tmp_vectors, vectors)
+    os.replace(tmp_vectors, paths["vectors"])
+    tmp_keys = paths["vector_keys"] + ".tmp"
+    with open(tmp_keys, "w") as f:
+        json.dump({"emb_model": emb_model_id, "keys": keys}, f)
+    os.replace(tmp_keys, paths["vector_keys"])
+
+
+def build_index(vectors: np.ndarray, index_config: Optional[Dict[str, Any]] = None):
+    """
+    Builds the configured faiss index over the vectors (row id == knowledge-base entry row).
+        'flat' -> exact IndexFlatL2
+        'ivf'  -> IndexIVFFlat, ivf_nlist clusters (capped by the number of vectors)
+        'hnsw' -> IndexHNSWFlat graph with hnsw_m links per node
+    """
+    index_config = index_config or {}
+    index_type = index_config.get("type", "flat")
+    dim = vectors.shape[1]
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "ivf":
+        nlist = max(1, min(index_config.get("ivf_nlist", 1024), len(vectors) // MIN_POINTS_PER_CLUSTER))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        index.train(vectors)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, index_config.get("hnsw_m", 32))
+        index.hnsw.efConstruction = index_config.get("hnsw_ef_construction", 200)
+    else:
+        raise ValueError(f"Unknown knowledge base index type: {index_type} (expected one of {INDEX_TYPES})")
+
+    index.add(vectors)
+    configure_search(index, index_config)
+    return index
+
+
+def configure_search(index, index_config: Optional[Dict[str, Any]] = None):
+    """
+    Applies the search-time knobs (recall vs latency) -> not stored in the index file.
+    """
+    index_config = index_config or {}
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(index_config.get("ivf_nprobe", 16), index.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = index_config.get("hnsw_ef_search", 64)
+
+
+def write_index(index, path: str, meta_path: Optional[str] = None, emb_model_id: Optional[str] = None):
+    """
+    Writes the index to a temp file and swaps it in -> serving workers that memory-map the
+    old file keep reading its (unlinked) inode instead of a file rewritten under them.
+    With meta_path the embedding fingerprint of the vectors is stored next to the index.
+    """
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+    if meta_path is not None:
+        tmp_meta = meta_path + ".tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump({"emb_model": emb_model_id, "vectors": int(index.ntotal)}, f)
+        os.replace(tmp_meta, meta_path)
+
+
+def check_index_fingerprint(paths: Dict[str, str], emb_model_id: str):
+    """
+    Refuses an index built with another embedding model / backend than the one serving the
+    queries (e.g. torch vectors searched with onnx-int8 queries). Indexes written before the
+    fingerprint was stored are loaded with a warning.
+
+    Raises:
+        RuntimeError: if the stored fingerprint differs from emb_model_id.
+    """
+    if not os.path.exists(paths["index_meta"]):
+        logger.warning(
+            f"{paths['index']} has no embedding fingerprint, cannot check it matches {emb_model_id} "
+            "-> rebuild it with python -m rag_modules.save_emb"
+        )
+        return
+    with open(paths["index_meta"]) as f:
+        built_with = json.load(f).get("emb_model")
+    if built_with != emb_model_id:
+        raise RuntimeError(
+            f"{paths['index']} was built with {built_with} embeddings but queries use {emb_model_id} "
+            "-> rebuild it with python -m rag_modules.save_emb"
+        )
+
+
+def read_index(path: str, index_config: Optional[Dict[str, Any]] = None):
+    """
+    Loads the index file. With mmap the vectors / inverted lists stay in the page cache,
+    shared by every worker process on the host, instead of one heap copy per process.
+    """
+    index_config = index_config or {}
+    flags = 0
+    if index_config.get("mmap", False):
+        #--IO_FLAG_MMAP_IFC (faiss >= 1.8) maps flat codes and IVF lists, older versions only IVF lists
+        #--HNSW graphs are always read into memory
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    index = faiss.read_index(path, flags)
+    configure_search(index, index_config)
+    return index
+
+
+def evaluate_index(
+    index,
+    vectors: np.ndarray,
+    k: int = 10,
+    num_queries: int = 200,
+    noise: float = 0.05,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Recall@k of the index against exact search, plus single-query latency and batched
+    throughput. Queries are perturbed knowledge-base vectors (stand-ins for unseen dish names).
+    """
+    rng = np.random.default_rng(seed)
+    num_queries = min(num_queries, len(vectors))
+    k = min(k, len(vectors))
+    rows = rng.choice(len(vectors), size=num_queries, replace=False)
+    queries = np.asarray(vectors[rows], dtype="float32")
+    scale = noise * float(np.linalg.norm(queries, axis=1).mean()) / np.sqrt(queries.shape[1])
+    queries = queries + rng.normal(0.0, scale, size=queries.shape).astype("float32")
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(np.asarray(vectors, dtype="float32"))
+    _, truth = exact.search(queries, k)
+
+    latencies = []
+    found = np.empty_like(truth)
+    for row in range(num_queries):
+        start = time.perf_counter()
+        _, found[row:row + 1] = index.search(queries[row:row + 1], k)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    index.search(queries, k)
+    batch_seconds = time.perf_counter() - start
+
+    hits = sum(len(set(truth[row]) & set(found[row])) for row in range(num_queries))
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "index_type": type(index).__name__,
+        "vectors": int(index.ntotal),
+        "k": k,
+        "queries": num_queries,
+        "recall_at_k": round(hits / (num_queries * k), 4),
+        "latency_ms_p50": round(float(np.percentile(latencies_ms, 50)), 4),
+        "latency_ms_p95": round(float(np.percentile(latencies_ms, 95)), 4),
+        "batch_queries_per_s": round(num_queries / batch_seconds, 1) if batch_seconds else None,
+    }
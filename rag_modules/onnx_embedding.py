@@ -0,0 +1,218 @@
+#===ONNX export of the sentence-transformers embedding model + onnxruntime inference without torch
+# python -m rag_modules.onnx_embedding export --quantize     (writes embedding_backend.onnx_dir, needs torch once)
+# python -m rag_modules.onnx_embedding parity                (top-k agreement with the torch model on the knowledge base)
+import argparse
+import json
+import os
+from typing import Any, Dict, List, Optional
+import numpy as np
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+EMBEDDING_CONFIG_FILE = "embedding_config.json"
+
+
+def export_onnx(model_id: str, output_dir: str, quantize: bool = False, cache_folder: Optional[str] = None, opset: int = 17) -> Dict[str, Any]:
+    """
+    Exports the transformer of a sentence-transformers model to ONNX (dynamic batch and
+    sequence axes) with its fast tokenizer and pooling settings; optionally adds an int8
+    dynamically quantized copy.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = SentenceTransformer(model_id, cache_folder=cache_folder, device="cpu")
+    transformer = model[0]
+    pooling_modes = [
+        getattr(module, "get_pooling_mode_str", lambda: None)() for module in model
+    ]
+    embedding_config = {
+        "model_id": model_id,
+        "max_seq_length": int(model.max_seq_length),
+        "pooling": next((mode for mode in pooling_modes if mode), "mean"),
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+    }
+
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(output_dir)
+    sample = tokenizer(["paneer tikka", "chicken curry"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    class LastHiddenState(torch.nn.Module):
+        #--keyword call + plain tensor output -> stable across transformers versions
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    model_path = os.path.join(output_dir, MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer.auto_model).eval(),
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+    logger.debug(f"exported {model_id} to {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(model_path, os.path.join(output_dir, QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+        logger.debug(f"int8 quantized model written to {os.path.join(output_dir, QUANTIZED_MODEL_FILE)}")
+
+    with open(os.path.join(output_dir, EMBEDDING_CONFIG_FILE), "w") as f:
+        json.dump(embedding_config, f, indent=2)
+    return embedding_config
+
+
+class OnnxEmbeddingModel:
+    """
+    Drop-in replacement for SentenceTransformer.encode on CPU: fast tokenizer + onnxruntime
+    session + pooling / normalization in NumPy. Never imports torch.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = False, intra_op_threads: int = 0):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, EMBEDDING_CONFIG_FILE)) as f:
+            self.embedding_config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.embedding_config["max_seq_length"])
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        #--one request at a time per session -> all threads go to the intra-op (matmul) pool
+        options.inter_op_num_threads = 1
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        model_file = QUANTIZED_MODEL_FILE if quantized else MODEL_FILE
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, sentences, batch_size: int = 64, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        outputs = []
+        for start in range(0, len(sentences), batch_size):
+            encodings = self.tokenizer.encode_batch(list(sentences[start:start + batch_size]))
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+            outputs.append(self.pool(hidden, feeds["attention_mask"]))
+        if not outputs:
+            return np.empty((0, 0), dtype="float32")
+        return np.concatenate(outputs).astype("float32")
+
+    def pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.embedding_config["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = attention_mask[..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.embedding_config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+
+def topk_agreement(reference: np.ndarray, candidate: np.ndarray, corpus_reference: np.ndarray, corpus_candidate: np.ndarray, k: int) -> float:
+    """
+    Mean overlap of the top-k nearest corpus rows (L2, like the faiss index) found with the
+    reference vectors vs the candidate vectors.
+    """
+    import faiss
+
+    def topk(queries: np.ndarray, corpus: np.ndarray) -> np.ndarray:
+        index = faiss.IndexFlatL2(corpus.shape[1])
+        index.add(corpus)
+        return index.search(queries, k)[1]
+
+    ref, cand = topk(reference, corpus_reference), topk(candidate, corpus_candidate)
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref, cand)]))
+
+
+def parity_check(reference_model, candidate_model, corpus: List[str], queries: List[str], k: int = 5) -> Dict[str, Any]:
+    """
+    Compares two embedding models on the knowledge base: cosine similarity of the vectors
+    and top-k agreement of knowledge-base retrieval for the query dish names.
+    """
+    k = min(k, len(corpus))
+    corpus_ref = np.asarray(reference_model.encode(corpus), dtype="float32")
+    corpus_cand = np.asarray(candidate_model.encode(corpus), dtype="float32")
+    queries_ref = np.asarray(reference_model.encode(queries), dtype="float32")
+    queries_cand = np.asarray(candidate_model.encode(queries), dtype="float32")
+
+    def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+    similarities = np.concatenate([cosine(corpus_ref, corpus_cand), cosine(queries_ref, queries_cand)])
+    return {
+        "corpus": len(corpus),
+        "queries": len(queries),
+        "k": k,
+        "cosine_min": round(float(similarities.min()), 5),
+        "cosine_mean": round(float(similarities.mean()), 5),
+        #--candidate queries against the candidate-encoded knowledge base (how serving would run)
+        "topk_agreement": round(topk_agreement(queries_ref, queries_cand, corpus_ref, corpus_cand, k), 4),
+        #--candidate queries against the knowledge base index built with the reference model
+        "topk_agreement_reference_index": round(topk_agreement(queries_ref, queries_cand, corpus_ref, corpus_ref, k), 4),
+    }
+
+
+def main():
+    from utils.load_config import load_config
+
+    config = load_config()
+    backend_config = config.get("embedding_backend") or {}
+
+    parser = argparse.ArgumentParser(description="Export / check the ONNX embedding backend.")
+    parser.add_argument("command", choices=("export", "parity"))
+    parser.add_argument("--output-dir", default=backend_config.get("onnx_dir"))
+    parser.add_argument("--quantize", action="store_true", help="Also write the int8 quantized model.")
+    parser.add_argument("--quantized", action="store_true", help="parity: check the int8 model.")
+    parser.add_argument("--queries", default="temp/dish_prices_list.json", help="parity: extraction JSON with dish names to query.")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(json.dumps(export_onnx(config["emb_model"], args.output_dir, args.quantize, config.get("emb_model_cache_dir"))))
+        return
+
+    from sentence_transformers import SentenceTransformer
+    from rag_modules.kb_index import kb_paths
+
+    with open(kb_paths(config["knowledge_based_file_name"])["json"]) as f:
+        corpus = [entry["item"] for entry in json.load(f)]
+    queries = list(corpus)
+    if args.queries and os.path.exists(args.queries):
+        with open(args.queries) as f:
+            queries += [dish["name"] for dish in json.load(f).get("dishes", [])]
+
+    reference = SentenceTransformer(config["emb_model"], cache_folder=config.get("emb_model_cache_dir"), device="cpu")
+    candidate = OnnxEmbeddingModel(args.output_dir, quantized=args.quantized, intra_op_threads=backend_config.get("intra_op_threads", 0))
+    print(json.dumps(parity_check(reference, candidate, corpus, queries, k=args.k)))
+
+
+if __name__ == "__main__":
+    main()
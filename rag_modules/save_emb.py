@@ -1,7 +1,11 @@
-from sentence_transformers import SentenceTransformer
-import faiss
+#===build / update the knowledge-base faiss index
+# python -m rag_modules.save_emb                      (incremental -> only new or changed items are embedded)
+# python -m rag_modules.save_emb --full               (re-embed every item)
+# python -m rag_modules.save_emb --index-type hnsw --evaluate
+import argparse
 import json
-import numpy as np
+from rag_modules.kb_index import INDEX_TYPES, kb_paths, load_vector_store, embed_entries, save_vector_store, build_index, write_index, evaluate_index
+from model_instances import ModelInstances
 
 #---load config file
 from utils.load_config import load_config
@@ -13,28 +17,51 @@ logger = get_logger(__name__)
 #--load config from config.yaml file
 config = load_config()
 #====================================
-emb_model_id=config['emb_model']
-emb_model = SentenceTransformer(emb_model_id)
-logger.debug(f"embedding model :{emb_model_id} loaded successfully..")
-#====================================
 
-#====================================
-json_path='rag_modules/' + config['knowledge_based_file_name'] + '.json'
-with open(json_path) as f:
-    data = json.load(f)
-logger.debug(f"knowledge based json file : {json_path} loaded successfully..")
-#====================================
 
-#====================================
-corpus = [d["item"] for d in data]
-vectors = emb_model.encode(corpus)
+def main():
+    index_config = dict(config.get("knowledge_base_index") or {})
 
-index = faiss.IndexFlatL2(vectors.shape[1])
-index.add(np.array(vectors))
-#====================================
+    parser = argparse.ArgumentParser(description="Build or incrementally update the knowledge-base index.")
+    parser.add_argument("--full", action="store_true", help="Re-embed every item instead of reusing stored vectors.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=index_config.get("type", "flat"))
+    parser.add_argument("--evaluate", action="store_true", help="Report recall@k and latency against exact search.")
+    args = parser.parse_args()
+    index_config["type"] = args.index_type
 
-#====================================
-index_file_path='rag_modules/' + config['knowledge_based_file_name'] + '.index'
-faiss.write_index(index, index_file_path)
-logger.debug(f"knowledge based index file : {index_file_path} created successfully..")
-#====================================
\ No newline at end of file
+    #====================================
+    paths = kb_paths(config['knowledge_based_file_name'])
+    with open(paths["json"]) as f:
+        data = json.load(f)
+    logger.debug(f"knowledge based json file : {paths['json']} loaded successfully..")
+    #====================================
+
+    #====================================
+    #--same engine as serving (torch or onnx) -> knowledge base and queries share one vector space
+    emb_fingerprint = ModelInstances.embedding_fingerprint()
+    previous = {} if args.full else load_vector_store(paths)
+
+    def encode(texts):
+        #--model only loaded when there is something to embed
+        return ModelInstances.get_embedding_model().encode(texts)
+
+    vectors, keys, stats = embed_entries(data, encode, emb_fingerprint, previous)
+    save_vector_store(paths, vectors, keys, emb_fingerprint)
+    logger.debug(f"knowledge base vectors : {stats['embedded']} embedded, {stats['reused']} reused")
+    #====================================
+
+    #====================================
+    index = build_index(vectors, index_config)
+    write_index(index, paths["index"], paths["index_meta"], emb_fingerprint)
+    logger.debug(f"knowledge based index file : {paths['index']} ({args.index_type}) created successfully..")
+    #====================================
+
+    report = {"entries": len(data), **stats, "index_type": args.index_type}
+    if args.evaluate:
+        report["evaluation"] = evaluate_index(index, vectors)
+    print(json.dumps(report))
+    return report
+
+
+if __name__ == "__main__":
+    main()
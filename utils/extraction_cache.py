@@ -0,0 +1,198 @@
+#===disk-backed cache of menu image extraction results, keyed by image content
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Any, Dict, Optional
+from PIL import Image
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+def image_sha256(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+
+def extraction_fingerprint(prompt: str, model_id: str, *settings: Any) -> str:
+    """
+    Identifies what produced an extraction (prompt, model and the request / image settings
+    that change the model output) -> entries from another prompt, model or setting are invalid.
+    """
+    payload = json.dumps([model_id, prompt, *settings], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def image_dhash(img: Image.Image, hash_size: int = 8) -> int:
+    """
+    Perceptual difference hash -> 64-bit int that stays (nearly) the same when the menu
+    photo is re-encoded, resized or slightly recompressed.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    #--sqlite INTEGER is signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+class ExtractionCache:
+    """
+    SQLite-backed extraction cache with TTL expiry, LRU eviction and an entry/byte size cap.
+
+    mode:
+        'sha256' -> only byte-identical uploads hit the cache.
+        'phash'  -> falls back to the nearest perceptual hash within phash_max_distance bits.
+    """
+
+    def __init__(self, path: str, fingerprint: str = "", mode: str = "sha256", phash_max_distance: int = 4,
+                 ttl_seconds: Optional[float] = None, max_entries: int = 10000, max_bytes: int = 100 * 1024 * 1024):
+        if mode not in ("sha256", "phash"):
+            raise ValueError(f"Unknown extraction cache mode: {mode}")
+        self.path = path
+        self.fingerprint = fingerprint
+        self.mode = mode
+        self.phash_max_distance = phash_max_distance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.phash_hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                phash INTEGER,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        #--caches written before entries carried a fingerprint
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(extraction_cache)")]
+        if "fingerprint" not in columns:
+            self._conn.execute("ALTER TABLE extraction_cache ADD COLUMN fingerprint TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_extraction_cache_access ON extraction_cache(last_access)")
+        #--prompt, model or extraction settings changed since these entries were written -> drop them
+        stale = self._conn.execute("DELETE FROM extraction_cache WHERE fingerprint IS NOT ?", (fingerprint,)).rowcount
+        self._conn.commit()
+        if stale:
+            logger.debug(f"extraction cache invalidated {stale} entries from a previous prompt/model/settings")
+
+    @classmethod
+    def from_config(cls, cache_config: Optional[Dict[str, Any]], fingerprint: str = "") -> Optional["ExtractionCache"]:
+        if not cache_config or not cache_config.get("enabled", False):
+            return None
+        return cls(
+            path=cache_config["path"],
+            fingerprint=fingerprint,
+            mode=cache_config.get("mode", "sha256"),
+            phash_max_distance=cache_config.get("phash_max_distance", 4),
+            ttl_seconds=cache_config.get("ttl_seconds"),
+            max_entries=cache_config.get("max_entries", 10000),
+            max_bytes=cache_config.get("max_bytes", 100 * 1024 * 1024),
+        )
+
+    def _key(self, contents: bytes) -> str:
+        #--fingerprint in the key -> processes running another prompt/model never share entries
+        return f"{self.fingerprint}:{image_sha256(contents)}"
+
+    def _expired_before(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds else float("-inf")
+
+    def get(self, contents: bytes, img: Optional[Image.Image] = None) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached extraction for this image, or None on a miss.
+        """
+        key = self._key(contents)
+        #--hashed outside the lock
+        phash = image_dhash(img) if (self.mode == "phash" and img is not None) else None
+        with self._lock:
+            self._conn.execute("DELETE FROM extraction_cache WHERE created_at < ?", (self._expired_before(),))
+            row = self._conn.execute("SELECT key, value FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+
+            if row is None and phash is not None:
+                #--scan the hashes only, the payload is read for the best match alone
+                best = None
+                for cand_key, cand_phash in self._conn.execute(
+                    "SELECT key, phash FROM extraction_cache WHERE phash IS NOT NULL AND fingerprint = ?",
+                    (self.fingerprint,),
+                ):
+                    distance = ((cand_phash ^ phash) & ((1 << 64) - 1)).bit_count()
+                    if distance <= self.phash_max_distance and (best is None or distance < best[0]):
+                        best = (distance, cand_key)
+                if best is not None:
+                    row = self._conn.execute("SELECT key, value FROM extraction_cache WHERE key = ?", (best[1],)).fetchone()
+                    if row is not None:
+                        self.phash_hits += 1
+                        logger.debug(f"extraction cache perceptual hit (distance {best[0]})")
+
+            if row is None:
+                self.misses += 1
+                self._conn.commit()
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE extraction_cache SET last_access = ? WHERE key = ?", (time.time(), row[0]))
+            self._conn.commit()
+        return json.loads(row[1])
+
+    def put(self, contents: bytes, value: Dict[str, Any], img: Optional[Image.Image] = None):
+        key = self._key(contents)
+        phash = image_dhash(img) if (self.mode == "phash" and img is not None) else None
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, phash, value, size, fingerprint, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, phash, payload, len(payload), self.fingerprint, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Drops expired entries, then least recently used entries until under the size caps.
+        """
+        self._conn.execute("DELETE FROM extraction_cache WHERE created_at < ?", (self._expired_before(),))
+        count, total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache"
+        ).fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM extraction_cache ORDER BY last_access ASC"
+        ).fetchall():
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+            count -= 1
+            total_bytes -= size
+            evicted += 1
+        logger.debug(f"extraction cache evicted {evicted} entries")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "phash_hits": self.phash_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
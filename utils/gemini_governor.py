@@ -0,0 +1,411 @@
+#===client-side governor for Gemini calls -> token bucket, AIMD concurrency, jittered retries, circuit breaker
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+#--HTTP status codes of google.api_core exceptions (.code) -> retryable failure kind
+THROTTLE_CODES = (429,)
+TIMEOUT_CODES = (408, 504)
+SERVER_ERROR_CODES = (500, 502, 503)
+
+
+class GeminiUnavailableError(Exception):
+    """
+    The model could not answer: retries exhausted on throttling / timeouts / server errors,
+    or the circuit breaker is open. Callers degrade (RAG-only decisions) instead of failing.
+    """
+
+
+class CircuitOpenError(GeminiUnavailableError):
+    """
+    Raised without calling the model while the circuit breaker is open.
+    """
+
+
+def failure_kind(error: BaseException) -> Optional[str]:
+    """
+    'throttle', 'timeout' or 'server' for retryable failures, None for everything else
+    (bad request, parse errors, ...) which is raised to the caller right away.
+    """
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    try:
+        code = int(getattr(error, "code", None))
+    except (TypeError, ValueError):
+        return None
+    if code in THROTTLE_CODES:
+        return "throttle"
+    if code in TIMEOUT_CODES:
+        return "timeout"
+    if code in SERVER_ERROR_CODES:
+        return "server"
+    return None
+
+
+class TokenBucket:
+    """
+    Requests per second sized to the API quota, with bursts up to `burst` requests.
+    reserve() takes a token and returns how long the caller has to wait for it, so waiting
+    callers are served in arrival order without polling.
+    """
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD limit on concurrent model calls: +1/limit per success (about +1 per round of
+    `limit` calls), multiplied by decrease_factor on throttling or timeouts.
+    Shared by sync callers (worker threads) and async callers on any event loop.
+    """
+
+    def __init__(self, initial: float, minimum: float = 1, maximum: float = 32, decrease_factor: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        #--threading.Event (sync waiter) or (loop, future) (async waiter), in arrival order
+        self._waiters: deque = deque()
+
+    def _has_room(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    def _wake(self):
+        #--called with the lock held
+        while self._waiters and self._has_room():
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(self._grant, future)
+
+    def _grant(self, future: asyncio.Future):
+        if future.cancelled():
+            #--waiter gave up after its slot was handed over
+            self.release()
+        else:
+            future.set_result(None)
+
+    def acquire_sync(self):
+        with self._lock:
+            if self._has_room():
+                self.in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._has_room():
+                self.in_flight += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter not in self._waiters
+                if not granted:
+                    self._waiters.remove(waiter)
+            #--slot granted but not used -> give it back (a cancelled future is released by _grant)
+            if granted and not waiter[1].cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self):
+        with self._lock:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._wake()
+
+    def on_overload(self):
+        with self._lock:
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after failure_threshold consecutive failed calls; open -> half_open after
+    recovery_seconds, when a single probe call is let through; the probe closes the circuit
+    on success and reopens it on failure.
+    """
+
+    STATES = ("closed", "half_open", "open")
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.recovery_seconds:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            #--a probe that never reported back (cancelled caller) is replaced after recovery_seconds
+            probe_pending = self._probe_in_flight and time.monotonic() - self._probe_started < self.recovery_seconds
+            if self.state == "open" or (self.state == "half_open" and probe_pending):
+                raise CircuitOpenError("Gemini circuit breaker is open")
+            if self.state == "half_open":
+                self._probe_in_flight = True
+                self._probe_started = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Gemini circuit breaker closed")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Gemini circuit breaker opened after {self.consecutive_failures} consecutive failures")
+                    self.opens += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class GeminiGovernor:
+    """
+    Every model call goes through: circuit breaker -> token bucket -> adaptive concurrency
+    slot -> call. Throttling, timeouts and server errors are retried with full-jitter
+    exponential backoff; when retries run out (or the circuit is open) GeminiUnavailableError
+    is raised.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 60,
+        burst: int = 10,
+        initial_concurrency: float = 4,
+        min_concurrency: float = 1,
+        max_concurrency: float = 16,
+        decrease_factor: float = 0.5,
+        max_retries: int = 3,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 8.0,
+        failure_threshold: int = 5,
+        recovery_seconds: float = 30.0,
+    ):
+        self.bucket = TokenBucket(requests_per_minute / 60, burst)
+        self.limit = AdaptiveConcurrencyLimit(initial_concurrency, min_concurrency, max_concurrency, decrease_factor)
+        self.breaker = CircuitBreaker(failure_threshold, recovery_seconds)
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.calls = 0
+        self.retries = 0
+        self.rejected = 0
+        self.failures: Dict[str, int] = {"throttle": 0, "timeout": 0, "server": 0}
+
+    @classmethod
+    def from_config(cls, governor_config: Optional[Dict[str, Any]]) -> Optional["GeminiGovernor"]:
+        if not governor_config or not governor_config.get("enabled", False):
+            return None
+        keys = (
+            "requests_per_minute", "burst", "initial_concurrency", "min_concurrency", "max_concurrency",
+            "decrease_factor", "max_retries", "backoff_base_seconds", "backoff_max_seconds",
+            "failure_threshold", "recovery_seconds",
+        )
+        return cls(**{key: governor_config[key] for key in keys if key in governor_config})
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+
+    def retry_schedule_seconds(self, attempt_timeout_seconds: float) -> float:
+        """
+        Longest a call can take when every attempt times out: all attempts plus the largest
+        backoffs (token bucket and concurrency waits not included).
+        """
+        backoffs = sum(min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** i) for i in range(self.max_retries))
+        return (self.max_retries + 1) * attempt_timeout_seconds + backoffs
+
+    def _before_attempt(self):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.rejected += 1
+            raise
+        self.calls += 1
+
+    def _on_failure(self, error: Exception) -> bool:
+        """
+        Records a failed attempt -> True when it is worth retrying.
+        """
+        kind = failure_kind(error)
+        if kind is None:
+            #--the API answered -> healthy as far as the breaker is concerned
+            self.breaker.record_success()
+            return False
+        self.failures[kind] += 1
+        if kind in ("throttle", "timeout"):
+            self.limit.on_overload()
+        self.breaker.record_failure()
+        logger.debug(f"Gemini call failed ({kind}): {error}")
+        return True
+
+    def _on_success(self):
+        self.limit.on_success()
+        self.breaker.record_success()
+
+    async def call_async(self, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        last_error: Optional[Exception] = None
+        for attempt_number in range(self.max_retries + 1):
+            if attempt_number:
+                self.retries += 1
+                await asyncio.sleep(self.backoff(attempt_number - 1))
+            self._before_attempt()
+            await asyncio.sleep(self.bucket.reserve())
+            await self.limit.acquire()
+            try:
+                result = await attempt()
+            except Exception as e:
+                if not self._on_failure(e):
+                    raise
+                last_error = e
+                continue
+            finally:
+                self.limit.release()
+            self._on_success()
+            return result
+        raise GeminiUnavailableError(f"Gemini call failed after {self.max_retries + 1} attempts: {last_error}") from last_error
+
+    def call(self, attempt: Callable[[], Any]) -> Any:
+        last_error: Optional[Exception] = None
+        for attempt_number in range(self.max_retries + 1):
+            if attempt_number:
+                self.retries += 1
+                time.sleep(self.backoff(attempt_number - 1))
+            self._before_attempt()
+            time.sleep(self.bucket.reserve())
+            self.limit.acquire_sync()
+            try:
+                result = attempt()
+            except Exception as e:
+                if not self._on_failure(e):
+                    raise
+                last_error = e
+                continue
+            finally:
+                self.limit.release()
+            self._on_success()
+            return result
+        raise GeminiUnavailableError(f"Gemini call failed after {self.max_retries + 1} attempts: {last_error}") from last_error
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+            "concurrency_limit": round(self.limit.limit, 2),
+            "in_flight": self.limit.in_flight,
+            "calls": self.calls,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "failures": dict(self.failures),
+        }
+
+    def collect_metrics(self):
+        stats = self.stats()
+        return [
+            ("gemini_breaker_state", "gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open).", {},
+             CircuitBreaker.STATES.index(stats["breaker_state"])),
+            ("gemini_breaker_opens_total", "counter", "Times the circuit breaker opened.", {}, stats["breaker_opens"]),
+            ("gemini_concurrency_limit", "gauge", "Current adaptive (AIMD) concurrency limit.", {}, stats["concurrency_limit"]),
+            ("gemini_in_flight", "gauge", "Gemini calls in flight.", {}, stats["in_flight"]),
+            ("gemini_attempts_total", "counter", "Gemini call attempts, retries included.", {}, stats["calls"]),
+            ("gemini_retries_total", "counter", "Gemini call attempts that were retries.", {}, stats["retries"]),
+            ("gemini_rejected_total", "counter", "Gemini calls rejected by the open circuit breaker.", {}, stats["rejected"]),
+        ] + [
+            ("gemini_failures_total", "counter", "Failed Gemini call attempts by kind.", {"kind": kind}, count)
+            for kind, count in stats["failures"].items()
+        ]
+
+
+class GovernedModel:
+    """
+    Wraps a Gemini backend (live, fake, record, replay) so that every generate call goes
+    through the governor; async attempts get attempt_timeout_seconds each.
+    An async caller's in-flight `slot` is acquired per attempt, after the governor's
+    rate / concurrency waits, and released between retries.
+    """
+
+    def __init__(self, model, governor: GeminiGovernor, attempt_timeout_seconds: Optional[float] = None):
+        self.model = model
+        self.governor = governor
+        self.attempt_timeout_seconds = attempt_timeout_seconds
+
+    def generate_content(self, contents, **kwargs):
+        return self.governor.call(lambda: self.model.generate_content(contents, **kwargs))
+
+    def retry_schedule_seconds(self) -> Optional[float]:
+        """
+        Worst-case duration of an async call (None when attempts have no timeout).
+        """
+        if self.attempt_timeout_seconds is None:
+            return None
+        return self.governor.retry_schedule_seconds(self.attempt_timeout_seconds)
+
+    async def generate_content_async(self, contents, slot: Optional[asyncio.Semaphore] = None, **kwargs):
+        """
+        With a slot, a successful stream=True call returns with the slot still held -> the
+        caller releases it once the stream is consumed.
+        """
+        async def attempt():
+            if slot is None:
+                return await asyncio.wait_for(
+                    self.model.generate_content_async(contents, **kwargs), timeout=self.attempt_timeout_seconds
+                )
+            await slot.acquire()
+            keep_slot = False
+            try:
+                response = await asyncio.wait_for(
+                    self.model.generate_content_async(contents, **kwargs), timeout=self.attempt_timeout_seconds
+                )
+                keep_slot = kwargs.get("stream", False)
+                return response
+            finally:
+                if not keep_slot:
+                    slot.release()
+
+        return await self.governor.call_async(attempt)
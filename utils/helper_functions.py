@@ -1,24 +1,328 @@
-from PIL import Image
+from PIL import Image, ImageOps, ImageStat
 import io
-from typing import Dict, Any
-from gemini_v0.gemini_extraction import extract_dishes_with_prices
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple, Optional, AsyncIterator
+from gemini_v0.gemini_extraction import (
+    EXTRACTION_PROMPT, extract_dishes_with_prices, extract_dishes_with_prices_async, iter_extract_dishes_async,
+    extraction_request_kwargs,
+)
+from utils.extraction_cache import ExtractionCache, extraction_fingerprint, image_sha256
+from utils.image_tiling import should_tile, split_into_tiles, merge_tile_results
+from utils.load_config import load_config
+from utils.metrics import metrics, cache_collector
+from utils.single_flight import SingleFlight
 from utils.logger_setup import get_logger
 
 logger = get_logger(__name__)
 
+config = load_config()
+#--content-addressed cache of extraction results (None when disabled), invalidated when the prompt,
+#--model or the settings shaping the model input / output change
+extraction_cache = ExtractionCache.from_config(
+    config.get("extraction_cache"),
+    fingerprint=extraction_fingerprint(
+        EXTRACTION_PROMPT, config["gemini_model_id"], extraction_request_kwargs(),
+        config.get("image_preprocessing"), config.get("tiling"),
+    ),
+)
+metrics.register_collector(cache_collector("extraction", extraction_cache))
+#--concurrent requests for the same image bytes share one extraction (None when disabled)
+extraction_flight = SingleFlight("extraction") if (config.get("single_flight") or {}).get("enabled", False) else None
+if extraction_flight is not None:
+    metrics.register_collector(extraction_flight.collect_metrics)
+
+def preprocess_image(img: Image.Image, preprocess_config: Optional[Dict[str, Any]]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Prepares a menu image for vision extraction: fixes EXIF orientation, converts to
+    grayscale when the image carries (almost) no colour, downscales to max_long_edge and
+    re-encodes to a compact format.
+
+    Args:
+        img: Decoded menu image.
+        preprocess_config: image_preprocessing section of config.yaml (None/disabled -> image unchanged).
+
+    Returns:
+        (image for the model, stats) -> the image is an inline {"mime_type", "data"} blob so
+        the compact encoding is what gets uploaded.
+    """
+    if not preprocess_config or not preprocess_config.get("enabled", False):
+        return img, {}
+
+    start = time.perf_counter()
+    original_size = img.size
+    processed = ImageOps.exif_transpose(img)
+
+    #--flatten transparency on white, menus are text on a light background
+    if processed.mode in ("RGBA", "LA", "P"):
+        processed = processed.convert("RGBA")
+        background = Image.new("RGB", processed.size, (255, 255, 255))
+        background.paste(processed, mask=processed.getchannel("A"))
+        processed = background
+    elif processed.mode not in ("RGB", "L"):
+        processed = processed.convert("RGB")
+
+    #--grayscale only where it is safe (no colour information worth keeping)
+    grayscale_mode = preprocess_config.get("grayscale", "auto")
+    to_gray = grayscale_mode == "always"
+    if grayscale_mode == "auto" and processed.mode == "RGB":
+        mean_saturation = ImageStat.Stat(processed.convert("HSV").getchannel("S")).mean[0]
+        to_gray = mean_saturation <= preprocess_config.get("grayscale_max_saturation", 24)
+    if to_gray and processed.mode != "L":
+        processed = processed.convert("L")
+
+    #--downscale so the long edge fits max_long_edge
+    max_long_edge = preprocess_config.get("max_long_edge")
+    if max_long_edge and max(processed.size) > max_long_edge:
+        scale = max_long_edge / max(processed.size)
+        new_size = (max(1, round(processed.width * scale)), max(1, round(processed.height * scale)))
+        processed = processed.resize(new_size, Image.Resampling.LANCZOS)
+
+    #--re-encode to a compact format
+    image_format = preprocess_config.get("format", "JPEG").upper()
+    buffer = io.BytesIO()
+    processed.save(buffer, format=image_format, quality=preprocess_config.get("quality", 85), optimize=True)
+    data = buffer.getvalue()
+
+    stats = {
+        "original_size": original_size,
+        "processed_size": processed.size,
+        "grayscale": processed.mode == "L",
+        "format": image_format,
+        "processed_bytes": len(data),
+        "preprocess_ms": (time.perf_counter() - start) * 1000,
+    }
+    return {"mime_type": Image.MIME[image_format], "data": data}, stats
+
+
+def log_preprocess_stats(contents: bytes, stats: Dict[str, Any]):
+    if stats:
+        stats["original_bytes"] = len(contents)
+        stats["bytes_saved"] = len(contents) - stats["processed_bytes"]
+        logger.debug(f"image preprocessing: {stats}")
+
+
+def merge_tiles(tile_results: List[Dict[str, Any]], boxes: List[tuple], tiling_config: Dict[str, Any]) -> Dict[str, Any]:
+    merged = merge_tile_results(tile_results, tiling_config.get("name_similarity", 0.85), boxes)
+    #--a tile whose response was cut short makes the whole image incomplete -> not cached
+    if any((result or {}).get("truncated") for result in tile_results):
+        merged["truncated"] = True
+    return merged
+
+
+def extract_tiled_sync(pil_image: Image.Image) -> Dict[str, Any]:
+    """
+    Tiling mode for very large / dense menus: the image is split into overlapping tiles,
+    every tile is extracted concurrently and the results are merged and deduped.
+    A failing tile only loses its own dishes.
+    """
+    tiling_config = config["tiling"]
+    tiles, boxes = split_into_tiles(pil_image, tiling_config)
+    logger.debug(f"Extracting dishes from {len(tiles)} tiles of a {pil_image.size} image...")
+
+    def extract_tile(tile: Image.Image) -> Dict[str, Any]:
+        try:
+            model_image, _ = preprocess_image(tile, config.get("image_preprocessing"))
+            return extract_dishes_with_prices(model_image)
+        except Exception as e:
+            logger.warning(f"Error extracting dishes from tile: {e}", exc_info=True)
+            return {}
+
+    with metrics.span("extraction_tiled"), ThreadPoolExecutor(max_workers=tiling_config.get("concurrency", 4)) as executor:
+        tile_results = list(executor.map(extract_tile, tiles))
+    return merge_tiles(tile_results, boxes, tiling_config)
+
+
+async def extract_tiled_async(pil_image: Image.Image) -> Dict[str, Any]:
+    """
+    Async version of extract_tiled_sync.
+    """
+    tiling_config = config["tiling"]
+    tiles, boxes = await asyncio.to_thread(split_into_tiles, pil_image, tiling_config)
+    logger.debug(f"Extracting dishes from {len(tiles)} tiles of a {pil_image.size} image (async)...")
+    semaphore = asyncio.Semaphore(tiling_config.get("concurrency", 4))
+
+    async def extract_tile(tile: Image.Image) -> Dict[str, Any]:
+        try:
+            async with semaphore:
+                model_image, _ = await asyncio.to_thread(preprocess_image, tile, config.get("image_preprocessing"))
+                return await extract_dishes_with_prices_async(model_image)
+        except Exception as e:
+            logger.warning(f"Error extracting dishes from tile: {e}", exc_info=True)
+            return {}
+
+    with metrics.span("extraction_tiled"):
+        tile_results = await asyncio.gather(*(extract_tile(tile) for tile in tiles))
+    return merge_tiles(tile_results, boxes, tiling_config)
+
+
 def process_image_sync(contents: bytes) -> Dict[str, Any]:
+    with metrics.span("process_image"):
+        return _process_image_sync(contents)
+
+
+def _process_image_sync(contents: bytes) -> Dict[str, Any]:
     try:
         pil_image = Image.open(io.BytesIO(contents))
         image_menu_data: Dict[str, Any] = {}
 
+        #--check extraction cache before calling the model
+        if extraction_cache is not None:
+            cached = extraction_cache.get(contents, pil_image)
+            if cached is not None:
+                logger.debug("Extraction cache hit, skipping Gemini call")
+                return cached
+
         try:
-            logger.debug("Extracting dishes with prices from image using Gemini...")
-            image_menu_data = extract_dishes_with_prices(pil_image)
+            if should_tile(pil_image, config.get("tiling")):
+                image_menu_data = extract_tiled_sync(pil_image)
+            else:
+                model_image, preprocess_stats = preprocess_image(pil_image, config.get("image_preprocessing"))
+                log_preprocess_stats(contents, preprocess_stats)
+                logger.debug("Extracting dishes with prices from image using Gemini...")
+                with metrics.span("extraction"):
+                    image_menu_data = extract_dishes_with_prices(model_image)
         except Exception as e:
             logger.warning(f"Error extracting dishes with prices: {e}", exc_info=True)
             return {}
 
+        #--cache only successful, complete extractions
+        if extraction_cache is not None and image_menu_data and not image_menu_data.get("truncated"):
+            extraction_cache.put(contents, image_menu_data, pil_image)
+
         return image_menu_data
     except Exception as e:
         logger.warning(f"Error processing image: {e}", exc_info=True)
-        return {}
\ No newline at end of file
+        return {}
+
+async def process_image_async(contents: bytes) -> Dict[str, Any]:
+    """
+    Async version of process_image_sync.
+    Image decoding and cache lookups run in worker threads, the model call goes through
+    the async Gemini client -> the event loop is never blocked. Concurrent calls with the
+    same image bytes share one extraction and its result dict.
+    """
+    with metrics.span("process_image"):
+        if extraction_flight is None:
+            return await _process_image_async(contents)
+        key = await asyncio.to_thread(image_sha256, contents)
+        return await extraction_flight.do(key, lambda: _process_image_async(contents))
+
+
+async def _process_image_async(contents: bytes) -> Dict[str, Any]:
+    try:
+        pil_image = await asyncio.to_thread(Image.open, io.BytesIO(contents))
+        image_menu_data: Dict[str, Any] = {}
+
+        #--check extraction cache before calling the model
+        if extraction_cache is not None:
+            cached = await asyncio.to_thread(extraction_cache.get, contents, pil_image)
+            if cached is not None:
+                logger.debug("Extraction cache hit, skipping Gemini call")
+                return cached
+
+        try:
+            if should_tile(pil_image, config.get("tiling")):
+                image_menu_data = await extract_tiled_async(pil_image)
+            else:
+                model_image, preprocess_stats = await asyncio.to_thread(
+                    preprocess_image, pil_image, config.get("image_preprocessing")
+                )
+                log_preprocess_stats(contents, preprocess_stats)
+                logger.debug("Extracting dishes with prices from image using async Gemini client...")
+                with metrics.span("extraction"):
+                    image_menu_data = await extract_dishes_with_prices_async(model_image)
+        except Exception as e:
+            logger.warning(f"Error extracting dishes with prices: {e}", exc_info=True)
+            return {}
+
+        #--cache only successful, complete extractions
+        if extraction_cache is not None and image_menu_data and not image_menu_data.get("truncated"):
+            await asyncio.to_thread(extraction_cache.put, contents, image_menu_data, pil_image)
+
+        return image_menu_data
+    except Exception as e:
+        logger.warning(f"Error processing image: {e}", exc_info=True)
+        return {}
+
+
+async def iter_process_image_async(contents: bytes) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streamed version of process_image_async -> yields the dishes of the image one by one as
+    the model generates them, so they can be classified while extraction is still running.
+    Cache hits and tiled images yield their complete result at once. Streams are not shared
+    between concurrent callers (no single-flight); a complete extraction is still cached.
+    A failed extraction ends the stream early and is not cached.
+    """
+    with metrics.span("process_image"):
+        try:
+            pil_image = await asyncio.to_thread(Image.open, io.BytesIO(contents))
+        except Exception as e:
+            logger.warning(f"Error processing image: {e}", exc_info=True)
+            return
+
+        #--check extraction cache before calling the model
+        if extraction_cache is not None:
+            cached = await asyncio.to_thread(extraction_cache.get, contents, pil_image)
+            if cached is not None:
+                logger.debug("Extraction cache hit, skipping Gemini call")
+                for dish in cached.get("dishes", []):
+                    yield dish
+                return
+
+        try:
+            if should_tile(pil_image, config.get("tiling")):
+                image_menu_data = await extract_tiled_async(pil_image)
+                for dish in image_menu_data.get("dishes", []):
+                    yield dish
+            else:
+                model_image, preprocess_stats = await asyncio.to_thread(
+                    preprocess_image, pil_image, config.get("image_preprocessing")
+                )
+                log_preprocess_stats(contents, preprocess_stats)
+                logger.debug("Extracting dishes with prices from image using a streamed Gemini call...")
+                dishes: List[Dict[str, Any]] = []
+                with metrics.span("extraction_streamed"):
+                    async for dish in iter_extract_dishes_async(model_image):
+                        dishes.append(dish)
+                        yield dish
+                image_menu_data = {"dishes": dishes} if dishes else {}
+        except Exception as e:
+            logger.warning(f"Error extracting dishes with prices: {e}", exc_info=True)
+            return
+
+        #--cache only successful, complete extractions
+        if extraction_cache is not None and image_menu_data and not image_menu_data.get("truncated"):
+            await asyncio.to_thread(extraction_cache.put, contents, image_menu_data, pil_image)
+
+
+def dish_key(dish: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Normalized (name, price) key used to dedupe the same dish across menu pages.
+    """
+    name = " ".join(str(dish.get("name", "")).lower().split())
+    price = str(dish.get("price", "") or "").strip()
+    return name, price
+
+
+def merge_dish_lists(dish_prices_lists: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merges the per-image extraction results into a single deduplicated dish list.
+
+    Args:
+        dish_prices_lists: List of {"dishes": [...]} dicts, one per image (empty dict on failure).
+
+    Returns:
+        {"dishes": [...]} with the first occurrence of every (name, price) pair kept in page order.
+    """
+    merged: List[Dict[str, Any]] = []
+    seen = set()
+    for dish_prices_list in dish_prices_lists:
+        for dish in (dish_prices_list or {}).get("dishes", []):
+            key = dish_key(dish)
+            if not key[0] or key in seen:
+                continue
+            seen.add(key)
+            merged.append(dish)
+    return {"dishes": merged}
@@ -0,0 +1,128 @@
+#===split very large / dense menu images into overlapping tiles and merge the per-tile extractions
+import math
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image, ImageOps
+from utils.text_normalize import normalize_dish_name
+
+
+def should_tile(img: Image.Image, tiling_config: Optional[Dict[str, Any]]) -> bool:
+    if not tiling_config or not tiling_config.get("enabled", False):
+        return False
+    return max(img.size) > tiling_config.get("min_long_edge", 2400)
+
+
+def tile_boxes(width: int, height: int, tile_size: int, overlap: float) -> List[tuple]:
+    """
+    Crop boxes (left, upper, right, lower) covering the image with tiles of at most
+    tile_size pixels that overlap their neighbours by the given fraction.
+    """
+    def spans(length: int) -> List[tuple]:
+        if length <= tile_size:
+            return [(0, length)]
+        step = int(tile_size * (1 - overlap))
+        count = math.ceil((length - tile_size) / step) + 1
+        #--spread tiles evenly so the last one ends exactly at the image border
+        stride = (length - tile_size) / (count - 1)
+        return [(round(i * stride), round(i * stride) + tile_size) for i in range(count)]
+
+    return [(left, upper, right, lower) for upper, lower in spans(height) for left, right in spans(width)]
+
+
+def split_into_tiles(img: Image.Image, tiling_config: Dict[str, Any]) -> Tuple[List[Image.Image], List[tuple]]:
+    """
+    (tiles, their crop boxes) -> the boxes tell merge_tile_results which tiles overlap.
+    """
+    img = ImageOps.exif_transpose(img)
+    boxes = tile_boxes(img.width, img.height, tiling_config.get("tile_size", 1400), tiling_config.get("overlap", 0.15))
+    return [img.crop(box) for box in boxes], boxes
+
+
+def boxes_overlap(a: tuple, b: tuple) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def normalize_price(price: Any) -> str:
+    return "".join(ch for ch in str(price or "") if ch.isdigit() or ch == ".")
+
+
+def similar_words(a: List[str], b: List[str], name_similarity: float) -> bool:
+    return len(a) == len(b) and all(
+        x == y or SequenceMatcher(None, x, y).ratio() >= name_similarity for x, y in zip(a, b)
+    )
+
+
+def border_cut(short: str, long: str, name_similarity: float) -> bool:
+    """
+    True when `short` is `long` cut off at a tile border: its last (or first) word is a
+    strict, mid-word prefix (or suffix) of the matching word of `long`, and its other words
+    match word for word (small misreads tolerated). A missing whole word is never a cut ->
+    "Naan" is not "Butter Naan" and "Veg Biryani" is not "Egg Biryani".
+    """
+    short_words, long_words = short.split(), long.split()
+    if not short_words or len(short_words) > len(long_words) or len(short) >= len(long):
+        return False
+    #--cut on the right: "paneer butter mas" <- "paneer butter masala"
+    head, cut, word = short_words[:-1], short_words[-1], long_words[len(short_words) - 1]
+    if len(cut) < len(word) and similar_words(head, long_words[:len(head)], name_similarity) \
+            and similar_words([cut], [word[:len(cut)]], name_similarity):
+        return True
+    #--cut on the left: "ter masala" <- "butter masala"
+    tail, cut, word = short_words[1:], short_words[0], long_words[len(long_words) - len(short_words)]
+    return len(cut) < len(word) and similar_words(tail, long_words[len(long_words) - len(tail):], name_similarity) \
+        and similar_words([cut], [word[len(word) - len(cut):]], name_similarity)
+
+
+def same_dish(a: Dict[str, Any], b: Dict[str, Any], name_similarity: float) -> bool:
+    """
+    Two extractions from overlapping tiles are the same dish when the names are equal and
+    the prices do not contradict each other, or when one name is the other cut off at the
+    tile border and both carry the same price.
+    """
+    name_a, name_b = normalize_dish_name(a.get("name", "")), normalize_dish_name(b.get("name", ""))
+    if not name_a or not name_b:
+        return False
+    price_a, price_b = normalize_price(a.get("price")), normalize_price(b.get("price"))
+    if price_a and price_b and price_a != price_b:
+        return False
+    if name_a == name_b:
+        return True
+    #--a cut-off name only counts with a price match
+    if not (price_a and price_b):
+        return False
+    short, long = sorted((name_a, name_b), key=len)
+    return border_cut(short, long, name_similarity)
+
+
+def merge_tile_results(tile_results: List[Dict[str, Any]], name_similarity: float = 0.85,
+                       boxes: Optional[List[tuple]] = None) -> Dict[str, Any]:
+    """
+    Merges per-tile {"dishes": [...]} results in tile order, deduping dishes that were
+    extracted twice from the overlap between tiles. Only dishes of different, overlapping
+    tiles (per boxes; any two tiles without boxes) are compared -> two dishes of one tile
+    are never merged. The most complete copy is kept (longer name, price present).
+    """
+    merged: List[Dict[str, Any]] = []
+    #--tiles every merged dish was seen in
+    sources: List[set] = []
+
+    def neighbours(tile: int, seen_in: set) -> bool:
+        if tile in seen_in:
+            return False
+        return boxes is None or any(boxes_overlap(boxes[tile], boxes[other]) for other in seen_in)
+
+    for tile, tile_result in enumerate(tile_results):
+        for dish in (tile_result or {}).get("dishes", []):
+            for i, kept in enumerate(merged):
+                if neighbours(tile, sources[i]) and same_dish(kept, dish, name_similarity):
+                    better_name = len(str(dish.get("name", ""))) > len(str(kept.get("name", "")))
+                    merged[i] = {
+                        "name": dish.get("name") if better_name else kept.get("name"),
+                        "price": kept.get("price") or dish.get("price"),
+                    }
+                    sources[i].add(tile)
+                    break
+            else:
+                merged.append(dish)
+                sources.append({tile})
+    return {"dishes": merged}
@@ -0,0 +1,364 @@
+#===asynchronous job API backend -> bounded in-process queue, worker pool, SQLite job store with result TTL
+import asyncio
+import json
+import math
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+import httpx
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+JOB_STATES = ("queued", "running", "succeeded", "failed")
+
+
+class QueueFullError(Exception):
+    """
+    Raised by JobQueue.submit when the queue is at capacity; carries the suggested retry delay.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_started(pid: int) -> Optional[int]:
+    """
+    Start time of the process in clock ticks since boot (Linux /proc) -> tells a reused pid
+    from the process that created a job; None where it cannot be read.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            #--the command name (field 2) may contain spaces -> fields counted after its ')'
+            return int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _process_live(pid: Optional[int], started: Optional[int]) -> bool:
+    """
+    True when the process that created a job (of another boot of this store) still runs.
+    """
+    if pid is None or pid == os.getpid() or not _pid_alive(pid):
+        return False
+    return started is None or _process_started(pid) == started
+
+
+class JobStore:
+    """
+    Job state in SQLite (WAL) -> status survives restarts and can be polled from any
+    worker process sharing the file. Finished jobs expire after result_ttl_seconds.
+    Every job records its owner: instance id, a boot id generated per process start, and the
+    pid + process start time. A restarting process fails the unfinished jobs of this instance
+    left by other boots whose process is gone -> also after a container restart that keeps the
+    hostname and hands the new process the same pid, never the live jobs of its peers.
+    """
+
+    def __init__(self, path: str, result_ttl_seconds: float = 3600, instance_id: str = ""):
+        self.result_ttl_seconds = result_ttl_seconds
+        self.instance_id = instance_id or socket.gethostname()
+        self.boot_id = uuid.uuid4().hex
+        self._pid = os.getpid()
+        self._started = _process_started(self._pid)
+        self._lock = Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                expires_at REAL,
+                callback_url TEXT,
+                result TEXT,
+                error TEXT,
+                owner TEXT,
+                owner_pid INTEGER,
+                owner_boot TEXT,
+                owner_started INTEGER
+            )
+            """
+        )
+        #--stores created before jobs had an owner
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("owner_pid", "INTEGER"), ("owner_boot", "TEXT"), ("owner_started", "INTEGER")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.commit()
+
+    def create(self, callback_url: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, created_at, callback_url, owner, owner_pid, owner_boot, owner_started) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, time.time(), callback_url, self.instance_id, self._pid, self.boot_id, self._started),
+            )
+            self._conn.commit()
+        return job_id
+
+    def mark_running(self, job_id: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ?", (time.time(), job_id))
+            self._conn.commit()
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, expires_at = ?, result = ?, error = ? WHERE job_id = ?",
+                (
+                    "failed" if error is not None else "succeeded",
+                    now,
+                    now + self.result_ttl_seconds,
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    job_id,
+                ),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, status, created_at, started_at, finished_at, expires_at, result, error FROM jobs "
+                "WHERE job_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (job_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "status", "created_at", "started_at", "finished_at", "expires_at", "result", "error")
+        job = dict(zip(keys, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            evicted = self._conn.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)).rowcount
+            self._conn.commit()
+        return evicted
+
+    def fail_unfinished(self, reason: str) -> int:
+        """
+        Jobs queued / running when their process stopped -> their inputs lived in memory only.
+        Jobs of this instance from another boot whose process is gone (plus ownerless jobs
+        of older stores) are failed; jobs of other live workers / hosts are left alone.
+        """
+        now = time.time()
+        with self._lock:
+            orphaned = [
+                job_id
+                for job_id, pid, started in self._conn.execute(
+                    "SELECT job_id, owner_pid, owner_started FROM jobs WHERE status IN ('queued', 'running') "
+                    "AND (owner IS NULL OR (owner = ? AND owner_boot IS NOT ?))",
+                    (self.instance_id, self.boot_id),
+                ).fetchall()
+                if not _process_live(pid, started)
+            ]
+            count = 0
+            for start in range(0, len(orphaned), 500):
+                chunk = orphaned[start:start + 500]
+                count += self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, expires_at = ?, error = ? "
+                    f"WHERE status IN ('queued', 'running') AND job_id IN ({', '.join('?' * len(chunk))})",
+                    (now, now + self.result_ttl_seconds, reason, *chunk),
+                ).rowcount
+            self._conn.commit()
+        return count
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: dict(rows).get(status, 0) for status in JOB_STATES}
+
+
+class JobQueue:
+    """
+    Bounded asyncio queue drained by `concurrency` worker tasks.
+    submit() never waits for a slot: a full queue raises QueueFullError (-> HTTP 429 + Retry-After).
+    Job store calls run in a thread -> SQLite never blocks the event loop.
+    callback_url must use one of callback_allowed_schemes and point at one of callback_allowed_hosts
+    ("*.example.com" matches subdomains); no allowed hosts -> callbacks are refused.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        process: Callable[[Any], Awaitable[Dict[str, Any]]],
+        concurrency: int = 2,
+        max_queue: int = 32,
+        retry_after_seconds: int = 5,
+        callback_timeout_seconds: float = 10.0,
+        eviction_interval_seconds: float = 60.0,
+        callback_allowed_schemes: Iterable[str] = ("https",),
+        callback_allowed_hosts: Iterable[str] = (),
+    ):
+        self.store = store
+        self.process = process
+        self.concurrency = concurrency
+        self.retry_after_seconds = retry_after_seconds
+        self.callback_timeout_seconds = callback_timeout_seconds
+        self.eviction_interval_seconds = eviction_interval_seconds
+        self.callback_allowed_schemes = {scheme.lower() for scheme in callback_allowed_schemes}
+        self.callback_allowed_hosts = [host.lower() for host in callback_allowed_hosts]
+        self._queue: Optional[asyncio.Queue] = None
+        self.max_queue = max_queue
+        self._tasks = []
+        self.running = 0
+        self.rejected = 0
+        #--submissions between the capacity check and the enqueue (the store insert awaits)
+        self._reserved = 0
+        #--moving average of job duration -> Retry-After estimate
+        self.avg_job_seconds: Optional[float] = None
+        #--per-status job store counts as of the last refresh -> metrics never query SQLite on the loop
+        self.job_counts: Dict[str, int] = {status: 0 for status in JOB_STATES}
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        interrupted = await asyncio.to_thread(
+            self.store.fail_unfinished, "Service restarted before the job finished; please resubmit."
+        )
+        if interrupted:
+            logger.warning(f"{interrupted} unfinished jobs from a previous run marked as failed")
+        await asyncio.to_thread(self.refresh_counts)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._evict_loop()))
+        logger.debug(f"job queue started with {self.concurrency} workers, capacity {self.max_queue}")
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a queue slot is likely free: queued work spread over the workers.
+        """
+        if self.avg_job_seconds is None:
+            return self.retry_after_seconds
+        estimate = self._queue.qsize() * self.avg_job_seconds / self.concurrency
+        return max(self.retry_after_seconds, math.ceil(estimate))
+
+    def check_callback_url(self, callback_url: str):
+        """
+        Raises ValueError unless the URL uses an allowed scheme and host -> the server cannot
+        be made to POST to arbitrary (e.g. internal) addresses.
+        """
+        parts = urlsplit(callback_url)
+        if parts.scheme.lower() not in self.callback_allowed_schemes:
+            raise ValueError(f"callback_url scheme must be one of {sorted(self.callback_allowed_schemes)}")
+        host = (parts.hostname or "").lower()
+        for allowed in self.callback_allowed_hosts:
+            if host == allowed or (allowed.startswith("*.") and host.endswith(allowed[1:])):
+                return
+        raise ValueError(f"callback_url host {host!r} is not allowed")
+
+    async def submit(self, payload: Any, callback_url: Optional[str] = None) -> str:
+        if self._queue is None:
+            raise RuntimeError("job queue is not started")
+        if callback_url:
+            self.check_callback_url(callback_url)
+        if self._queue.qsize() + self._reserved >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after())
+        self._reserved += 1
+        try:
+            job_id = await asyncio.to_thread(self.store.create, callback_url)
+        finally:
+            self._reserved -= 1
+        self._queue.put_nowait((job_id, payload, callback_url))
+        return job_id
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id, payload, callback_url = await self._queue.get()
+            self.running += 1
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.store.mark_running, job_id)
+                result = await self.process(payload)
+                await asyncio.to_thread(self.store.finish, job_id, result=result)
+            except asyncio.CancelledError:
+                #--shutdown cancels the task -> write synchronously, another await could be cancelled too
+                self.store.finish(job_id, error="Service shut down before the job finished; please resubmit.")
+                raise
+            except Exception as e:
+                logger.exception(f"job {job_id} failed")
+                await asyncio.to_thread(self.store.finish, job_id, error=str(e))
+            finally:
+                self.running -= 1
+                self._queue.task_done()
+                elapsed = time.perf_counter() - start
+                self.avg_job_seconds = elapsed if self.avg_job_seconds is None else 0.8 * self.avg_job_seconds + 0.2 * elapsed
+
+            await asyncio.to_thread(self.refresh_counts)
+            if callback_url:
+                await self._notify(callback_url, await asyncio.to_thread(self.store.get, job_id))
+
+    async def _notify(self, callback_url: str, job: Optional[Dict[str, Any]]):
+        try:
+            async with httpx.AsyncClient(timeout=self.callback_timeout_seconds) as client:
+                await client.post(callback_url, json=job)
+        except Exception as e:
+            logger.warning(f"job callback to {callback_url} failed: {e}")
+
+    async def _evict_loop(self):
+        while True:
+            await asyncio.sleep(self.eviction_interval_seconds)
+            evicted = await asyncio.to_thread(self.store.evict_expired)
+            if evicted:
+                logger.debug(f"evicted {evicted} expired jobs")
+            await asyncio.to_thread(self.refresh_counts)
+
+    def refresh_counts(self) -> Dict[str, int]:
+        """
+        Re-reads the per-status counts from the job store (blocking -> call through asyncio.to_thread).
+        """
+        self.job_counts = self.store.counts()
+        return self.job_counts
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Queue state with fresh job store counts (blocking -> call through asyncio.to_thread).
+        """
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "rejected": self.rejected,
+            "avg_job_seconds": self.avg_job_seconds,
+            "jobs": self.refresh_counts(),
+        }
+
+    def collect_metrics(self):
+        #--called on the event loop by /metrics -> cached store counts (refreshed after every job and eviction pass)
+        return [
+            ("jobs_queued", "gauge", "Jobs waiting in the queue.", {}, self._queue.qsize() if self._queue is not None else 0),
+            ("jobs_running", "gauge", "Jobs being processed.", {}, self.running),
+            ("jobs_rejected_total", "counter", "Job submissions rejected with 429.", {}, self.rejected),
+        ] + [
+            ("jobs_stored", "gauge", "Jobs in the job store by status.", {"status": status}, count)
+            for status, count in self.job_counts.items()
+        ]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,50 @@
+#===startup / readiness state shared by the REST app and the MCP server health endpoints
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+class Readiness:
+    """
+    Tracks process start-up: liveness is true as soon as the process serves requests,
+    readiness only once warm_up() (model loads, first inference) has finished.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready = False
+        self.error: Optional[str] = None
+        self.startup_seconds: Optional[float] = None
+        self.warm_up_details: Dict[str, Any] = {}
+
+    def run_warm_up(self, warm_up: Callable[[], Optional[Dict[str, Any]]]):
+        try:
+            self.warm_up_details = warm_up() or {}
+            self.ready = True
+        except Exception as e:
+            logger.exception("warm-up failed")
+            self.error = str(e)
+        self.startup_seconds = round(time.perf_counter() - self.started_at, 3)
+        logger.debug(f"warm-up finished -> ready: {self.ready}, startup_seconds: {self.startup_seconds}")
+
+    def start_background_warm_up(self, warm_up: Callable[[], Optional[Dict[str, Any]]]) -> threading.Thread:
+        """
+        Runs warm_up() in a daemon thread -> the server binds its port immediately and
+        /health/live answers while the models load.
+        """
+        thread = threading.Thread(target=self.run_warm_up, args=(warm_up,), name="warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def report(self, models: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "startup_seconds": self.startup_seconds,
+            "uptime_seconds": round(time.perf_counter() - self.started_at, 3),
+            "warm_up": self.warm_up_details,
+            "models": models or {},
+        }
@@ -0,0 +1,193 @@
+#===pool of long-lived, initialized MCP client sessions shared across requests
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+from utils.logger_setup import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+
+class PooledSession:
+    """
+    One MCP client session kept open by a background task.
+    The streamable-http transport uses anyio task groups, which must be entered and exited
+    from the same task -> the owner task opens the transport, initializes the session and
+    keeps it open until close() is called.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session: Optional[ClientSession] = None
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+
+    async def start(self) -> "PooledSession":
+        self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+        if self.session is None:
+            raise ConnectionError(f"Could not open MCP session to {self.url}: {self._error}")
+        return self
+
+    async def _run(self):
+        try:
+            async with streamablehttp_client(self.url) as (read, write, get_session_id):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+            logger.warning(f"MCP session to {self.url} closed with error: {e}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def close(self):
+        self._closing.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except (asyncio.TimeoutError, Exception) as e:
+                logger.debug(f"MCP session close did not finish cleanly: {e}")
+                self._task.cancel()
+
+
+class MCPSessionPool:
+    """
+    Bounded pool of initialized MCP sessions.
+    Sessions are created lazily (or pre-warmed by start()), reused across requests and
+    replaced when a call on them fails.
+    """
+
+    def __init__(self, url: str, max_size: int = 4, min_size: int = 1, acquire_timeout: float = 30.0):
+        self.url = url
+        self.max_size = max_size
+        self.min_size = min(min_size, max_size)
+        self.acquire_timeout = acquire_timeout
+        self._idle: "asyncio.Queue[PooledSession]" = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max_size)
+        self._closed = False
+
+        #--pool metrics
+        self.acquire_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.connects = 0
+        self.reconnects = 0
+        self.failures = 0
+
+    async def start(self):
+        """
+        Pre-warms min_size sessions. A down MCP server is not fatal at startup -> sessions
+        are then opened lazily on first use.
+        """
+        for _ in range(self.min_size):
+            try:
+                self._idle.put_nowait(await self._connect())
+            except Exception as e:
+                logger.warning(f"MCP session pool warm-up failed, will connect lazily: {e}")
+                break
+        logger.debug(f"MCP session pool started with {self._idle.qsize()} idle sessions")
+
+    async def _connect(self) -> PooledSession:
+        conn = await PooledSession(self.url).start()
+        self.connects += 1
+        logger.debug(f"opened new MCP session ({self.connects} total)")
+        return conn
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Borrows an initialized session from the pool; waits if all max_size sessions are busy.
+        """
+        if self._closed:
+            raise RuntimeError("MCP session pool is closed")
+
+        start = time.perf_counter()
+        await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        waited = time.perf_counter() - start
+        self.acquire_count += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        metrics.observe("mcp_pool_wait_seconds", waited)
+
+        try:
+            conn = None
+            while not self._idle.empty():
+                candidate = self._idle.get_nowait()
+                if candidate.alive:
+                    conn = candidate
+                    break
+                await candidate.close()
+            if conn is None:
+                conn = await self._connect()
+
+            healthy = False
+            try:
+                yield conn.session
+                healthy = True
+            finally:
+                if healthy and not self._closed:
+                    self._idle.put_nowait(conn)
+                else:
+                    self.failures += 1
+                    await conn.close()
+        finally:
+            self._slots.release()
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any], retries: int = 1, progress_callback=None):
+        """
+        Calls an MCP tool on a pooled session, reconnecting and retrying on transport failure.
+        progress_callback(progress, total, message) receives the tool's progress notifications.
+        """
+        for attempt in range(retries + 1):
+            try:
+                async with self.session() as session:
+                    return await session.call_tool(name, arguments, progress_callback=progress_callback)
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                if attempt == retries or self._closed:
+                    raise
+                self.reconnects += 1
+                logger.warning(f"MCP call '{name}' failed ({e}), reconnecting and retrying...")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_size": self.max_size,
+            "idle": self._idle.qsize(),
+            "acquire_count": self.acquire_count,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_avg": self.wait_seconds_total / self.acquire_count if self.acquire_count else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+        }
+
+    def collect_metrics(self):
+        """
+        Pool gauges / counters for the metrics registry.
+        """
+        return [
+            ("mcp_pool_idle_sessions", "gauge", "Idle MCP sessions in the pool.", {}, self._idle.qsize()),
+            ("mcp_pool_connects_total", "counter", "MCP sessions opened.", {}, self.connects),
+            ("mcp_pool_reconnects_total", "counter", "MCP calls retried on a new session.", {}, self.reconnects),
+            ("mcp_pool_failures_total", "counter", "MCP sessions dropped after a failed call.", {}, self.failures),
+        ]
+
+    async def close(self):
+        self._closed = True
+        while not self._idle.empty():
+            await self._idle.get_nowait().close()
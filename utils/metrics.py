@@ -0,0 +1,147 @@
+#===in-process latency spans and counters exposed in Prometheus text format (/metrics)
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from utils.load_config import load_config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PREFIX = "vegmenu_"
+
+
+def format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{str(value)}"' for key, value in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus-style registry: counters and histograms keyed by (name, labels),
+    plus collector callbacks that report values owned by other objects (cache hit counters,
+    MCP pool stats) at scrape time.
+    When disabled every call returns immediately -> negligible overhead.
+    """
+
+    def __init__(self, enabled: bool = True, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+        self._histograms: Dict[Tuple[str, str], List[float]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        self._help.setdefault(PREFIX + name, (metric_type, help_text))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        if not self.enabled:
+            return
+        key = (PREFIX + name, format_labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        key = (PREFIX + name, format_labels(labels))
+        with self._lock:
+            #--per-bucket counts, then sum and count
+            state = self._histograms.get(key)
+            if state is None:
+                state = self._histograms[key] = [0.0] * (len(self.buckets) + 2)
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def _timer(self, name: str, labels: Dict[str, Any]):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def span(self, stage: str):
+        """
+        Times a pipeline stage into the stage_duration_seconds histogram.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._timer("stage_duration_seconds", {"stage": stage})
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]):
+        """
+        collector() yields (name, type, help, labels, value) tuples at scrape time.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        if not self.enabled:
+            return ""
+        lines: List[str] = []
+        emitted = set()
+
+        def header(name: str, metric_type: str, help_text: str):
+            if name not in emitted:
+                emitted.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(state)) for key, state in self._histograms.items())
+
+        for (name, labels), value in counters:
+            header(name, *self._help.get(name, ("counter", name)))
+            lines.append(f"{name}{labels} {value}")
+
+        for (name, labels), state in histograms:
+            header(name, *self._help.get(name, ("histogram", name)))
+            label_body = labels[1:-1] if labels else ""
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{{{label_body + ',' if label_body else ''}{le}}} {cumulative}")
+            lines.append(f"{name}_bucket{{{label_body + ',' if label_body else ''}le=\"+Inf\"}} {state[-1]}")
+            lines.append(f"{name}_sum{labels} {state[-2]}")
+            lines.append(f"{name}_count{labels} {state[-1]}")
+
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue
+            for name, metric_type, help_text, labels, value in samples:
+                header(PREFIX + name, metric_type, help_text)
+                lines.append(f"{PREFIX}{name}{format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+config = load_config()
+metrics = MetricsRegistry(enabled=(config.get("metrics") or {}).get("enabled", False))
+metrics.describe("stage_duration_seconds", "histogram", "Latency of pipeline stages in seconds.")
+metrics.describe("mcp_pool_wait_seconds", "histogram", "Time spent waiting for a free MCP session.")
+
+
+def cache_collector(cache_name: str, cache) -> Callable:
+    """
+    Collector reporting hit / miss counters and hit rate of a cache exposing stats().
+    """
+    def collect():
+        if cache is None:
+            return []
+        stats = cache.stats()
+        return [
+            ("cache_hits_total", "counter", "Cache hits.", {"cache": cache_name}, stats["hits"]),
+            ("cache_misses_total", "counter", "Cache misses.", {"cache": cache_name}, stats["misses"]),
+            ("cache_hit_rate", "gauge", "Cache hit rate since process start.", {"cache": cache_name}, stats["hit_rate"]),
+        ]
+    return collect
@@ -0,0 +1,141 @@
+#===single-flight coalescing -> concurrent identical keys share one in-flight call and its result
+import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+
+class _Flight:
+    """
+    One shared call: the task running it, a future per key it resolves and the number of
+    callers still waiting on it.
+    """
+
+    def __init__(self, keys: List[Hashable]):
+        loop = asyncio.get_running_loop()
+        self.futures: Dict[Hashable, asyncio.Future] = {key: loop.create_future() for key in keys}
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key within one event loop: the first caller starts
+    the call, callers arriving while it is in flight wait for the same result (or exception).
+    The shared call runs in its own task, so cancelling one caller does not cancel it; it is
+    only cancelled once every caller waiting on it is gone. Nothing is cached -> a key is only
+    shared while its call is in flight; a failed call is retried by the next caller.
+    Results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        #--keys computed by a call this layer started vs keys served from another caller's call
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Result of call() for key, shared with concurrent callers of the same key.
+        """
+        async def call_many(keys: List[Hashable]) -> AsyncIterator[Dict[Hashable, Any]]:
+            yield {key: await call()}
+
+        async with aclosing(self.do_many([key], call_many)) as results:
+            async for done in results:
+                return done[key]
+
+    async def do_many(
+        self,
+        keys: List[Hashable],
+        call_many: Callable[[List[Hashable]], AsyncIterator[Dict[Hashable, Any]]],
+    ) -> AsyncIterator[Dict[Hashable, Any]]:
+        """
+        Yields {key: result} groups for all keys as they become available. Keys already in
+        flight are awaited; the others are computed by one call_many(new_keys), an async
+        iterator of {key: result} groups, shared with later callers of the same keys.
+        Consume with contextlib.aclosing (or to the end) so a caller that stops early
+        is released right away.
+        """
+        keys = list(dict.fromkeys(keys))
+        new_keys = [key for key in keys if key not in self._flights]
+        self.coalesced += len(keys) - len(new_keys)
+        if new_keys:
+            self.calls += len(new_keys)
+            self._start(new_keys, call_many)
+
+        flights = {id(flight): flight for flight in (self._flights[key] for key in keys)}
+        for flight in flights.values():
+            flight.waiters += 1
+        try:
+            pending = {self._flights[key].futures[key]: key for key in keys}
+            while pending:
+                #--asyncio.wait never cancels what it waits on -> a cancelled caller leaves the shared call running
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                ready = {future: key for future, key in pending.items() if future.done()}
+                for future in ready:
+                    del pending[future]
+                #--raises the shared call's exception, if it failed
+                yield {key: future.result() for future, key in ready.items()}
+        finally:
+            for flight in flights.values():
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.task.done():
+                    logger.debug(f"{self.name}: last caller gone, cancelling shared call")
+                    self._forget(flight)
+                    flight.task.cancel()
+
+    def _start(self, keys: List[Hashable], call_many: Callable[[List[Hashable]], AsyncIterator[Dict[Hashable, Any]]]):
+        flight = _Flight(keys)
+
+        async def run():
+            try:
+                async with aclosing(call_many(keys)) as results:
+                    async for done in results:
+                        for key, value in done.items():
+                            future = flight.futures.get(key)
+                            if future is not None and not future.done():
+                                future.set_result(value)
+                missing = [key for key, future in flight.futures.items() if not future.done()]
+                if missing:
+                    raise KeyError(f"{self.name}: no result for {missing}")
+            except asyncio.CancelledError:
+                for future in flight.futures.values():
+                    future.cancel()
+                raise
+            except Exception as e:
+                for future in flight.futures.values():
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self._forget(flight)
+
+        for key in keys:
+            self._flights[key] = flight
+        flight.task = asyncio.ensure_future(run())
+
+    def _forget(self, flight: _Flight):
+        for key in flight.futures:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / total if total else 0.0,
+        }
+
+    def collect_metrics(self):
+        stats = self.stats()
+        labels = {"boundary": self.name}
+        return [
+            ("single_flight_calls_total", "counter", "Keys computed by a call started by the single-flight layer.", labels, stats["calls"]),
+            ("single_flight_coalesced_total", "counter", "Keys served from another caller's in-flight call.", labels, stats["coalesced"]),
+            ("single_flight_in_flight", "gauge", "Keys with a shared call in flight.", labels, stats["in_flight"]),
+        ]
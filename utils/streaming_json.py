@@ -0,0 +1,142 @@
+#===tolerant JSON parsing of model output -> lenient whole-document repair and an incremental parser for streamed responses
+import json
+import re
+from typing import Any, Dict, List, Optional
+from utils.logger_setup import get_logger
+
+logger = get_logger(__name__)
+
+#--trailing comma before a closing brace / bracket, the most common defect in model JSON
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def loads_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    json.loads of one object, retried without trailing commas (None when it still fails).
+    """
+    for candidate in (text, TRAILING_COMMA.sub(r"\1", text)):
+        try:
+            value = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        return value if isinstance(value, dict) else None
+    return None
+
+
+def json_starts(text: str) -> List[int]:
+    """
+    Offsets of the first opening brace and the first opening bracket, in text order ->
+    where the JSON document may begin after leading prose / markdown fences.
+    """
+    return sorted(i for i in (text.find("{"), text.find("[")) if i >= 0)
+
+
+def loads_lenient(text: str) -> Any:
+    """
+    json.loads that tolerates prose / fences around the JSON and trailing commas
+    (None when the document still does not parse, e.g. because it was truncated).
+    The document is decoded from its opening brace / bracket up to its own end, so
+    whatever follows it (even prose containing braces) is ignored.
+    """
+    decoder = json.JSONDecoder()
+    text = text or ""
+    for start in json_starts(text):
+        for candidate in (text[start:], TRAILING_COMMA.sub(r"\1", text[start:])):
+            try:
+                return decoder.raw_decode(candidate)[0]
+            except json.JSONDecodeError:
+                continue
+    return None
+
+
+class IncrementalArrayParser:
+    """
+    Feeds on text chunks of a response shaped like {"<key>": [{...}, {...}, ...]} and returns
+    every object of the array as soon as its closing brace has arrived.
+    Tolerant of what models put around the JSON: prose or markdown fences before the array,
+    trailing commas, a malformed object (skipped, the rest of the array is still parsed) and
+    a truncated stream (the objects completed before the cut are kept).
+    Only the unfinished tail of the text is buffered.
+    """
+
+    def __init__(self, key: str):
+        self._start_pattern = re.compile(r'"' + re.escape(key) + r'"\s*:\s*\[')
+        self._buffer = ""
+        self._pos = 0
+        #--'seek' (before the array), 'array' (inside it), 'done' (closing bracket seen)
+        self.state = "seek"
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start: Optional[int] = None
+        self.parsed = 0
+        self.skipped = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Objects completed by this chunk, in array order.
+        """
+        if self.state == "done" or not text:
+            return []
+        self._buffer += text
+        objects: List[Dict[str, Any]] = []
+
+        if self.state == "seek":
+            #--the key may be split across chunks -> search the whole (short) prefix again
+            match = self._start_pattern.search(self._buffer)
+            if match is None:
+                return objects
+            self._buffer = self._buffer[match.end():]
+            self._pos = 0
+            self.state = "array"
+
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer):
+            ch = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._object_start = pos
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buffer[self._object_start:pos + 1], objects)
+                    self._object_start = None
+            elif ch == "]" and self._depth == 0:
+                self.state = "done"
+                break
+            pos += 1
+
+        #--drop everything before the object being parsed
+        keep_from = pos if self._object_start is None else self._object_start
+        self._buffer = buffer[keep_from:]
+        self._pos = pos - keep_from
+        if self._object_start is not None:
+            self._object_start = 0
+        return objects
+
+    def _emit(self, text: str, objects: List[Dict[str, Any]]):
+        value = loads_object(text)
+        if value is None:
+            self.skipped += 1
+            logger.debug(f"skipping malformed array item: {text[:200]}")
+            return
+        self.parsed += 1
+        objects.append(value)
+
+    @property
+    def complete(self) -> bool:
+        """
+        True once the closing bracket of the array has been seen.
+        """
+        return self.state == "done"
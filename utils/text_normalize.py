@@ -0,0 +1,14 @@
+import re
+import unicodedata
+
+_non_word = re.compile(r"[^\w\s]")
+_spaces = re.compile(r"\s+")
+
+def normalize_dish_name(dish_name: str) -> str:
+    """
+    Canonical form of a dish name used as a cache / lookup key.
+    "  Dal-Fry! " -> "dal fry"
+    """
+    text = unicodedata.normalize("NFKC", str(dish_name)).lower()
+    text = _non_word.sub(" ", text)
+    return _spaces.sub(" ", text).strip()